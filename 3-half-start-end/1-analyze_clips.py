@@ -5,14 +5,22 @@ Runs Gemini AI on each clip and outputs natural language descriptions
 """
 
 import google.generativeai as genai
+from google import genai as google_genai
 import os
+import sys
+import re
 import time
+import asyncio
 from pathlib import Path
-import concurrent.futures
-from threading import Lock
 import argparse
 from dotenv import load_dotenv
 
+# Helpers shared by all stages live in gaa_common/ at the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from gaa_common.llm_cache import LLMCache, make_key
+from gaa_common.throttle import async_with_retry
+from gaa_common.synthesis import BATCH_POLL_SECONDS, BATCH_DONE_STATES
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -22,38 +30,26 @@ if not GEMINI_API_KEY:
     raise ValueError("GEMINI_API_KEY environment variable not set")
 genai.configure(api_key=GEMINI_API_KEY)
 
-# Thread safety
-results_lock = Lock()
+# Persistent response cache so re-runs skip clips already analyzed
+llm_cache = LLMCache()
+
+# Flash handles per-clip descriptions; override with --model
+MODEL_NAME = "gemini-2.5-flash"
+
+# Clip files are named clip_<minutes>m<seconds>s
+CLIP_NAME_PATTERN = re.compile(r'clip_(\d+)m(\d+)s')
+
+# Gemini Batch Mode settings (used when there are enough clips to be worth it)
+BATCH_MIN_CLIPS = 10
+BATCH_CHUNK_SIZE = 100
+
+# Counters are only touched from the event loop thread, so no lock is needed
 processed_count = 0
 error_count = 0
 
-def analyze_clip_for_halftime(clip_path, clip_name, output_dir):
-    """Analyze a single clip and write natural language description"""
-    global processed_count, error_count
-    
-    try:
-        # Extract timestamp from clip name (clip_15m30s.mp4 -> 15:30)
-        timestamp = clip_name.replace('clip_', '').replace('.mp4', '').replace('m', ':').replace('s', '')
-        
-        print(f"🎬 Analyzing {clip_name} ({timestamp})")
-        
-        # Upload video to Gemini
-        video_file = genai.upload_file(path=clip_path)
-        
-        # Wait for processing
-        while video_file.state.name == "PROCESSING":
-            time.sleep(1)
-            video_file = genai.get_file(video_file.name)
-        
-        if video_file.state.name == "FAILED":
-            raise ValueError(f"Video processing failed for {clip_name}")
-        
-        # Create the model
-        model = genai.GenerativeModel("gemini-2.5-flash")
-        
-        # Natural language prompt for halftime detection
-        prompt = f"""
-        Analyze this 15-second GAA football clip (timestamp: {timestamp}) and describe what you observe in natural language, focusing specifically on GAA MATCH TRANSITIONS and HALFTIME INDICATORS.
+# Static halftime detection instructions, sent as the system instruction
+HALFTIME_INSTRUCTIONS = """
+        Analyze the 15-second GAA football clip you are given and describe what you observe in natural language, focusing specifically on GAA MATCH TRANSITIONS and HALFTIME INDICATORS.
 
         Write a detailed description covering:
 
@@ -91,50 +87,255 @@ def analyze_clip_for_halftime(clip_path, clip_name, output_dir):
 
         Be specific about what you observe - don't guess or assume. If you see a throw-in ceremony, describe it explicitly.
         """
+
+# Per-clip status lines are buffered and printed in blocks with the progress line
+PROGRESS_SECONDS = 5
+clip_log = []
+
+def flush_clip_log(summary=None):
+    """Print buffered per-clip lines (plus an optional summary line) in one write"""
+    lines = clip_log + ([summary] if summary else [])
+    clip_log.clear()
+    if lines:
+        print("\n".join(lines))
+
+async def report_progress(total, start_time):
+    """Print buffered clip lines and an ETA every PROGRESS_SECONDS until cancelled"""
+    while True:
+        await asyncio.sleep(PROGRESS_SECONDS)
+        completed = processed_count + error_count
+        if not completed:
+            continue
+        rate = completed / (time.time() - start_time)
+        eta = (total - completed) / rate / 60
+        flush_clip_log(f"📈 Progress: {completed}/{total} ({completed/total*100:.1f}%) - ETA: {eta:.1f} min")
+
+def create_halftime_model():
+    """Model with the static instructions as its system instruction (a stable prefix for implicit caching)"""
+    return genai.GenerativeModel(MODEL_NAME, system_instruction=HALFTIME_INSTRUCTIONS)
+
+def clip_timestamp(clip_name):
+    """Extract timestamp from clip name (clip_15m30s.mp4 -> 15:30)"""
+    match = CLIP_NAME_PATTERN.match(clip_name)
+    if not match:
+        raise ValueError(f"Unrecognized clip name: {clip_name}")
+    return f"{match.group(1)}:{match.group(2)}"
+
+def build_halftime_prompt(timestamp):
+    """Per-clip part of the prompt; the static instructions go in HALFTIME_INSTRUCTIONS"""
+    return f"Clip timestamp: {timestamp}. Describe this clip as instructed."
+
+async def upload_clip(clip_path, clip_name):
+    """Upload a clip to the Gemini File API and wait until it is ACTIVE"""
+    # The SDK upload is blocking, so run it off the loop
+    video_file = await asyncio.to_thread(genai.upload_file, path=clip_path)
+    
+    # Wait for processing
+    while video_file.state.name == "PROCESSING":
+        await asyncio.sleep(1)
+        video_file = await asyncio.to_thread(genai.get_file, video_file.name)
+    
+    if video_file.state.name == "FAILED":
+        raise ValueError(f"Video processing failed for {clip_name}")
+    
+    return video_file
+
+async def write_description(output_dir, clip_name, timestamp, response_text):
+    """Write one clip's description file"""
+    output_file = output_dir / f"{clip_name.replace('.mp4', '.txt')}"
+    
+    description = f"TIMESTAMP: {timestamp}\nQUERY: Halftime Detection\n\nDESCRIPTION:\n{response_text}\n"
+    
+    await asyncio.to_thread(output_file.write_bytes, description.encode('utf-8'))
+    
+    return output_file
+
+async def analyze_clip_for_halftime(clip_path, clip_name, output_dir, model):
+    """Analyze a single clip and write natural language description"""
+    global processed_count, error_count
+    
+    try:
+        timestamp = clip_timestamp(clip_name)
         
-        # Generate description
-        response = model.generate_content([video_file, prompt])
+        clip_log.append(f"🎬 Analyzing {clip_name} ({timestamp})")
         
-        # Clean up uploaded file
-        genai.delete_file(video_file.name)
+        prompt = build_halftime_prompt(timestamp)
         
-        # Write description to file
-        output_file = output_dir / f"{clip_name.replace('.mp4', '.txt')}"
+        # Reuse a previous response for this exact clip + prompt if we have one
+        cache_key = await asyncio.to_thread(make_key, MODEL_NAME, HALFTIME_INSTRUCTIONS + prompt, clip_path)
+        response_text = llm_cache.get(cache_key)
         
-        description = f"TIMESTAMP: {timestamp}\nQUERY: Halftime Detection\n\nDESCRIPTION:\n{response.text}\n"
+        if response_text is None:
+            # Upload video to Gemini
+            video_file = await upload_clip(clip_path, clip_name)
+            
+            # Generate description
+            response = await async_with_retry(model.generate_content_async, [video_file, prompt])
+            response_text = response.text
+            llm_cache.set(cache_key, response_text)
+            
+            # Clean up uploaded file
+            await asyncio.to_thread(genai.delete_file, video_file.name)
         
-        with open(output_file, 'w') as f:
-            f.write(description)
+        # Write description to file
+        output_file = await write_description(output_dir, clip_name, timestamp, response_text)
         
-        with results_lock:
-            global processed_count
-            processed_count += 1
-            print(f"✅ {clip_name} → {output_file.name}")
+        processed_count += 1
+        clip_log.append(f"✅ {clip_name} → {output_file.name}")
         
         return True
         
     except Exception as e:
         print(f"❌ Error analyzing {clip_name}: {e}")
-        with results_lock:
-            global error_count
-            error_count += 1
+        error_count += 1
         return False
 
+async def run_all(clip_files, output_dir, concurrency):
+    """Analyze all clips on one event loop, with at most `concurrency` in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+    model = create_halftime_model()
+    
+    async def bounded(clip_file):
+        async with semaphore:
+            return await analyze_clip_for_halftime(str(clip_file), clip_file.name, output_dir, model)
+    
+    # Progress is reported on a timer, so clip completions never touch stdout
+    reporter = asyncio.create_task(report_progress(len(clip_files), time.time()))
+    try:
+        await asyncio.gather(*(bounded(clip_file) for clip_file in clip_files))
+    finally:
+        reporter.cancel()
+    
+    flush_clip_log()
+
+async def run_batch(clip_files, output_dir, concurrency):
+    """Analyze clips through Gemini Batch Mode (~50% cheaper than per-clip calls)"""
+    global processed_count, error_count
+    
+    # Cached clips are answered locally; only the rest go into the batch
+    pending = []
+    cached = 0
+    for clip_file in clip_files:
+        try:
+            timestamp = clip_timestamp(clip_file.name)
+        except ValueError as e:
+            print(f"❌ Error analyzing {clip_file.name}: {e}")
+            error_count += 1
+            continue
+        prompt = build_halftime_prompt(timestamp)
+        cache_key = await asyncio.to_thread(make_key, MODEL_NAME, HALFTIME_INSTRUCTIONS + prompt, str(clip_file))
+        response_text = llm_cache.get(cache_key)
+        
+        if response_text is not None:
+            await write_description(output_dir, clip_file.name, timestamp, response_text)
+            processed_count += 1
+            cached += 1
+        else:
+            pending.append((clip_file, timestamp, prompt, cache_key))
+    
+    print(f"📦 Submitting {len(pending)} clips in batch mode ({cached} cached)")
+    
+    # Videos still go through the File API, uploaded concurrently
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def bounded_upload(clip_file):
+        async with semaphore:
+            return await upload_clip(str(clip_file), clip_file.name)
+    
+    uploads = await asyncio.gather(*[bounded_upload(item[0]) for item in pending], return_exceptions=True)
+    
+    submitted = []
+    for item, video_file in zip(pending, uploads):
+        if isinstance(video_file, Exception):
+            print(f"❌ Error uploading {item[0].name}: {video_file}")
+            error_count += 1
+        else:
+            submitted.append((*item, video_file))
+    
+    client = google_genai.Client(api_key=GEMINI_API_KEY)
+    
+    # Inline batches are size-limited, so submit in chunks - all up front, so the jobs
+    # run side by side instead of one after another while the uploads age
+    chunks = [submitted[i:i + BATCH_CHUNK_SIZE] for i in range(0, len(submitted), BATCH_CHUNK_SIZE)]
+    jobs = []
+    for n, chunk in enumerate(chunks):
+        batch_requests = [
+            {
+                "contents": [{"role": "user", "parts": [
+                    {"file_data": {"file_uri": video_file.uri, "mime_type": video_file.mime_type}},
+                    {"text": prompt},
+                ]}],
+                "config": {"system_instruction": HALFTIME_INSTRUCTIONS},
+            }
+            for _, _, prompt, _, video_file in chunk
+        ]
+        
+        job = await asyncio.to_thread(
+            client.batches.create,
+            model=MODEL_NAME,
+            src=batch_requests,
+            config={"display_name": f"halftime-clips-{n * BATCH_CHUNK_SIZE}"},
+        )
+        print(f"📤 Submitted {job.name} ({len(chunk)} clips)")
+        jobs.append(job)
+    
+    async def refresh(job):
+        if job.state.name in BATCH_DONE_STATES:
+            return job
+        return await asyncio.to_thread(client.batches.get, name=job.name)
+    
+    # Poll every unfinished job together
+    while any(job.state.name not in BATCH_DONE_STATES for job in jobs):
+        await asyncio.sleep(BATCH_POLL_SECONDS)
+        jobs = await asyncio.gather(*(refresh(job) for job in jobs))
+    
+    for job, chunk in zip(jobs, chunks):
+        if job.state.name != "JOB_STATE_SUCCEEDED":
+            print(f"❌ {job.name} finished with state {job.state.name}")
+            error_count += len(chunk)
+        else:
+            # Inline responses come back in submission order
+            for (clip_file, timestamp, _, cache_key, _), inline in zip(chunk, job.dest.inlined_responses):
+                if inline.error or not inline.response:
+                    print(f"❌ Error analyzing {clip_file.name}: {inline.error}")
+                    error_count += 1
+                    continue
+                
+                llm_cache.set(cache_key, inline.response.text)
+                await write_description(output_dir, clip_file.name, timestamp, inline.response.text)
+                processed_count += 1
+            
+            print(f"✅ {job.name} complete ({processed_count} clips processed so far)")
+    
+    # Clean up uploaded files
+    for *_, video_file in submitted:
+        await asyncio.to_thread(genai.delete_file, video_file.name)
+
 def main():
+    global MODEL_NAME
     parser = argparse.ArgumentParser(description='Analyze clips for halftime detection')
     parser.add_argument('--clips-dir', type=str, default='../2-splitting/clips', 
                        help='Directory containing video clips')
     parser.add_argument('--output-dir', type=str, default='results/halftime_detection/clips',
                        help='Directory to save descriptions')
-    parser.add_argument('--threads', type=int, default=8, help='Number of parallel threads')
+    parser.add_argument('--concurrency', type=int, default=32, help='Maximum clips analyzed concurrently')
     parser.add_argument('--max-clips', type=int, help='Maximum clips to process (for testing)')
+    parser.add_argument('--model', type=str, default=MODEL_NAME,
+                       help='Gemini model used for the per-clip descriptions')
+    parser.add_argument('--force', action='store_true',
+                       help='Re-analyze clips that already have a description file')
+    parser.add_argument('--no-batch', action='store_true',
+                       help='Send one request per clip instead of using Gemini Batch Mode')
     
     args = parser.parse_args()
     
+    MODEL_NAME = args.model
+    
     print("🕐 HALFTIME DETECTION - CLIP ANALYSIS")
     print("=" * 60)
     print("Goal: Generate natural language descriptions for halftime detection")
-    print(f"Threads: {args.threads}")
+    print(f"Model: {MODEL_NAME}")
+    print(f"Concurrency: {args.concurrency}")
     print("=" * 60)
     
     # Setup directories
@@ -147,7 +348,11 @@ def main():
         return
     
     # Find clips
-    clip_files = sorted([f for f in clips_dir.glob("*.mp4") if f.name.startswith("clip_")])
+    with os.scandir(clips_dir) as entries:
+        clip_files = sorted(
+            Path(e.path) for e in entries
+            if e.is_file() and e.name.startswith("clip_") and e.name.endswith(".mp4")
+        )
     
     if args.max_clips:
         clip_files = clip_files[:args.max_clips]
@@ -156,28 +361,28 @@ def main():
         print("❌ No clip files found!")
         return
     
+    # Resume: skip clips whose description was written by an earlier run
+    if not args.force:
+        with os.scandir(output_dir) as entries:
+            done = {e.name[:-len(".txt")] for e in entries if e.name.endswith(".txt")}
+        skipped = sum(1 for f in clip_files if f.stem in done)
+        clip_files = [f for f in clip_files if f.stem not in done]
+        if skipped:
+            print(f"⏭️  Skipping {skipped} clips already described (use --force to redo)")
+        if not clip_files:
+            print("✅ All clips already described")
+            return
+    
     print(f"📊 Found {len(clip_files)} clips to analyze")
     
     start_time = time.time()
     
-    # Process clips in parallel
-    with concurrent.futures.ThreadPoolExecutor(max_workers=args.threads) as executor:
-        futures = []
-        
-        for clip_file in clip_files:
-            future = executor.submit(analyze_clip_for_halftime, str(clip_file), clip_file.name, output_dir)
-            futures.append(future)
-        
-        # Wait for completion with progress updates
-        completed = 0
-        for future in concurrent.futures.as_completed(futures):
-            completed += 1
-            if completed % 10 == 0:
-                elapsed = time.time() - start_time
-                rate = completed / elapsed
-                remaining = len(clip_files) - completed
-                eta = remaining / rate / 60
-                print(f"📈 Progress: {completed}/{len(clip_files)} ({completed/len(clip_files)*100:.1f}%) - ETA: {eta:.1f} min")
+    # Batch Mode for full runs; small test runs are quicker as direct requests
+    if not args.no_batch and len(clip_files) >= BATCH_MIN_CLIPS:
+        print("📦 Using Gemini Batch Mode")
+        asyncio.run(run_batch(clip_files, output_dir, args.concurrency))
+    else:
+        asyncio.run(run_all(clip_files, output_dir, args.concurrency))
     
     # Final summary
     processing_time = time.time() - start_time
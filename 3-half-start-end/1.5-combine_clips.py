@@ -4,6 +4,7 @@ Script 3: Combine All Clip Descriptions into One Big Text File
 Simple concatenation of all txt files from the clips analysis
 """
 
+import os
 from pathlib import Path
 
 def combine_all_clips():
@@ -17,7 +18,11 @@ def combine_all_clips():
         return
     
     # Find all txt files
-    txt_files = sorted([f for f in clips_dir.glob("*.txt") if f.name.startswith("clip_")])
+    with os.scandir(clips_dir) as entries:
+        txt_files = sorted(
+            Path(e.path) for e in entries
+            if e.is_file() and e.name.startswith("clip_") and e.name.endswith(".txt")
+        )
     
     if not txt_files:
         print("❌ No clip txt files found!")
@@ -40,8 +45,7 @@ def combine_all_clips():
             outfile.write(f"{'='*80}\n\n")
             
             # Add file content
-            with open(txt_file, 'r') as infile:
-                outfile.write(infile.read())
+            outfile.write(txt_file.read_bytes().decode('utf-8'))
             
             outfile.write("\n\n")
     
@@ -6,10 +6,18 @@ Read all 337 txt files, combine into one big string, send ONE request to Gemini
 
 import google.generativeai as genai
 import os
+import sys
+import re
 import time
+import argparse
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+# Helpers shared by all stages live in gaa_common/ at the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from gaa_common.llm_cache import LLMCache, make_key
+
 # Load environment variables
 load_dotenv()
 
@@ -19,43 +27,68 @@ if not GEMINI_API_KEY:
     raise ValueError("GEMINI_API_KEY environment variable not set")
 genai.configure(api_key=GEMINI_API_KEY)
 
-def main():
-    print("🎯 SINGLE REQUEST SYNTHESIS")
-    print("=" * 50)
-    print("Goal: Send all clip descriptions in ONE request")
-    print("Model: Gemini 2.5 Pro (better reasoning for complex analysis)")
-    print()
-    
-    # Read all 337 txt files
-    clips_dir = Path("results/halftime_detection/clips")
-    description_files = sorted([f for f in clips_dir.glob("*.txt") if f.name.startswith("clip_")])
-    
-    print(f"📁 Found {len(description_files)} description files")
-    
-    # Combine into one big string
-    print("🔄 Combining all descriptions...")
-    combined_text = ""
-    total_chars = 0
-    
-    for desc_file in description_files:
-        try:
-            with open(desc_file, 'r') as f:
-                content = f.read()
-                # Extract timestamp from filename
-                timestamp = desc_file.stem.replace('clip_', '').replace('m', ':').replace('s', '')
-                combined_text += f"\n{'='*80}\n"
-                combined_text += f"CLIP: {timestamp}\n"
-                combined_text += f"{'='*80}\n"
-                combined_text += content + "\n"
-                total_chars += len(content)
-        except Exception as e:
-            print(f"❌ Error reading {desc_file}: {e}")
-            continue
+# Phrases that mark a possible half start/end, used by --prefilter
+TRANSITION_PATTERN = re.compile(
+    r'throw-in ceremony|referee throw|final whistle|leaving (the )?(pitch|field)|walking off|center circle',
+    re.IGNORECASE
+)
+PREFILTER_MAX_CLIPS = 50  # Above this, candidates are synthesized per half of the timeline
+
+# Parallel description reads (helps most on network/slow disks)
+READ_WORKERS = 16
+
+# Clip files are named clip_<minutes>m<seconds>s
+CLIP_NAME_PATTERN = re.compile(r'clip_(\d+)m(\d+)s')
+
+def clip_timestamp(clip_name):
+    """Extract timestamp from clip name (clip_15m30s.mp4 -> 15:30)"""
+    match = CLIP_NAME_PATTERN.match(clip_name)
+    if not match:
+        raise ValueError(f"Unrecognized clip name: {clip_name}")
+    return f"{match.group(1)}:{match.group(2)}"
+
+def read_description(path):
+    """Read one description file -> (timestamp, content), or None if unreadable or misnamed"""
+    desc_file = Path(path)
+    try:
+        timestamp = clip_timestamp(desc_file.stem)
+    except ValueError as e:
+        print(f"⚠️  Skipping {desc_file}: {e}")
+        return None
     
-    print(f"📊 Combined text size: {total_chars:,} characters ({total_chars/1024/1024:.1f} MB)")
+    try:
+        # Whole-file read without the buffered text wrapper
+        content = desc_file.read_bytes().decode('utf-8')
+    except Exception as e:
+        print(f"❌ Error reading {desc_file}: {e}")
+        return None
     
-    # Create the synthesis prompt (temporal block analysis like web app)
-    prompt = f"""
+    return timestamp, content
+
+def read_descriptions(description_files):
+    """Yield (timestamp, content) per description file path, in order, reading in parallel"""
+    with ThreadPoolExecutor(max_workers=READ_WORKERS) as executor:
+        for description in executor.map(read_description, description_files):
+            if description is not None:
+                yield description
+
+def find_candidate_indices(descriptions):
+    """Indices of clips mentioning a transition phrase, plus their immediate neighbours"""
+    hits = [i for i, (_, content) in enumerate(descriptions) if TRANSITION_PATTERN.search(content)]
+    return sorted({j for i in hits for j in (i - 1, i, i + 1) if 0 <= j < len(descriptions)})
+
+def combine_descriptions(descriptions):
+    """Combine (timestamp, content) pairs into one big string (fragments joined once)"""
+    parts = []
+    for timestamp, content in descriptions:
+        parts.append(f"\n{'='*80}\nCLIP: {timestamp}\n{'='*80}\n")
+        parts.append(content)
+        parts.append("\n")
+    return "".join(parts)
+
+def build_synthesis_prompt(combined_text, clip_count):
+    """Create the synthesis prompt (temporal block analysis like web app)"""
+    return f"""
 You are analyzing a GAA (Gaelic Athletic Association) football match from video clips. GAA matches have a specific structure:
 
 GAA MATCH STRUCTURE:
@@ -67,7 +100,7 @@ GAA MATCH STRUCTURE:
 
 Each half starts with an OFFICIAL THROW-IN CEREMONY by the referee in the center circle.
 
-TASK: Analyze {len(description_files)} clips (00:00 to 84:00) to find the 4 key transition points.
+TASK: Analyze {clip_count} clips (00:00 to 84:00) to find the 4 key transition points.
 
 STEP 1 - CATEGORIZE EVERY CLIP:
 Go through each clip and categorize it as:
@@ -148,21 +181,139 @@ CRITICAL: Think like the web app - look for CONTINUOUS BLOCKS of activity, not i
 CLIPS TO ANALYZE:
 {combined_text}
 """
+
+def build_merge_prompt(part_results):
+    """Create the reduce prompt that turns per-half analyses into one timeline"""
+    parts = "".join(
+        f"\n{'='*80}\nPART {i} OF {len(part_results)}\n{'='*80}\n{text}\n"
+        for i, text in enumerate(part_results, 1)
+    )
+    return f"""
+You are combining {len(part_results)} partial analyses of ONE GAA football match. Each part only saw the
+candidate clips from its own section of the timeline, so each may have guessed transitions it could not see.
+
+Reconcile them into a single timeline with exactly one of each of the 4 key transitions, using the evidence
+from whichever part actually covers that moment. GAA halves are 30+ minutes and halftime is 10-15 minutes.
+
+OUTPUT FORMAT (exactly these sections, once each):
+
+BLOCK SUMMARY:
+Block 1: PRE-MATCH (00:00 - XX:XX)
+Block 2: ACTIVE PLAY (XX:XX - XX:XX) [First Half]
+Block 3: HALFTIME BREAK (XX:XX - XX:XX)
+Block 4: ACTIVE PLAY (XX:XX - XX:XX) [Second Half]
+Block 5: POST-MATCH (XX:XX - XX:XX)
+
+KEY TRANSITIONS:
+
+FIRST HALF START: [MM:SS]
+Evidence: "[quote from the parts]"
+Reasoning: "[why]"
+
+FIRST HALF END: [MM:SS]
+Evidence: "[quote from the parts]"
+Reasoning: "[why]"
+
+SECOND HALF START: [MM:SS]
+Evidence: "[quote from the parts]"
+Reasoning: "[why]"
+
+MATCH END: [MM:SS]
+Evidence: "[quote from the parts]"
+Reasoning: "[why]"
+
+TIMELINE VERIFICATION:
+First Half Duration: [X] minutes (should be 30+ minutes)
+Halftime Break: [X] minutes (should be 10-15 minutes)
+Second Half Duration: [X] minutes (should be 30+ minutes)
+
+PARTIAL ANALYSES:
+{parts}
+"""
+
+def main():
+    parser = argparse.ArgumentParser(description='Synthesize halftime timeline from clip descriptions')
+    parser.add_argument('--prefilter', action='store_true',
+                       help='Only send clips mentioning transition phrases (plus neighbours) to Gemini')
+    args = parser.parse_args()
     
-    print(f"📝 Prompt size: {len(prompt):,} characters")
-    print(f"🔄 Sending ONE request to Gemini 2.5 Flash...")
+    print("🎯 SINGLE REQUEST SYNTHESIS")
+    print("=" * 50)
+    print("Goal: Send all clip descriptions in ONE request")
+    print("Model: Gemini 2.5 Pro (better reasoning for complex analysis)")
+    print()
+    
+    # Read all 337 txt files
+    clips_dir = Path("results/halftime_detection/clips")
+    with os.scandir(clips_dir) as entries:
+        description_files = sorted(
+            e.path for e in entries
+            if e.is_file() and e.name.startswith("clip_") and e.name.endswith(".txt")
+        )
+    
+    print(f"📁 Found {len(description_files)} description files")
+    
+    descriptions = list(read_descriptions(description_files))
+    total_chars = sum(len(content) for _, content in descriptions)
+    
+    print(f"📊 Combined text size: {total_chars:,} characters ({total_chars/1024/1024:.1f} MB)")
+    
+    # By default the whole timeline goes in one request
+    groups = [descriptions]
+    
+    if args.prefilter:
+        candidates = find_candidate_indices(descriptions)
+        
+        if not candidates:
+            print("⚠️  No transition phrases found - falling back to full scan")
+        elif len(candidates) > PREFILTER_MAX_CLIPS:
+            # Split candidates by first/second half of the timeline
+            midpoint = len(descriptions) // 2
+            groups = [
+                [descriptions[i] for i in candidates if i < midpoint],
+                [descriptions[i] for i in candidates if i >= midpoint],
+            ]
+            groups = [group for group in groups if group]
+        else:
+            groups = [[descriptions[i] for i in candidates]]
+        
+        if candidates:
+            print(f"🔎 Pre-filter kept {len(candidates)}/{len(descriptions)} clips "
+                  f"in {len(groups)} request(s)")
     
     try:
         # Send ONE request to Gemini 2.5 Pro (better reasoning for complex analysis)
         model = genai.GenerativeModel("gemini-2.5-flash")
         
+        # Identical descriptions + prompt are answered from the local cache
+        cache = LLMCache()
+        
+        responses = []
         start_time = time.time()
-        response = model.generate_content(prompt)
+        
+        for group in groups:
+            prompt = build_synthesis_prompt(combine_descriptions(group), len(group))
+            
+            print(f"📝 Prompt size: {len(prompt):,} characters")
+            print(f"🔄 Sending request to Gemini 2.5 Flash...")
+            
+            cache_key = make_key(model.model_name, prompt)
+            responses.append(cache.get_or_set(cache_key, lambda: model.generate_content(prompt).text))
+        
+        # Reduce per-half results with one small request (a single request needs no merging);
+        # each half only saw part of the match, so their transitions must be reconciled
+        if len(responses) == 1:
+            response_text = responses[0]
+        else:
+            merge_prompt = build_merge_prompt(responses)
+            print(f"🔗 Merging {len(responses)} partial analyses ({len(merge_prompt):,} characters)...")
+            merge_key = make_key(model.model_name, merge_prompt)
+            response_text = cache.get_or_set(merge_key, lambda: model.generate_content(merge_prompt).text)
+        
         processing_time = time.time() - start_time
         
         print(f"✅ SUCCESS! Processed in {processing_time:.1f} seconds")
         print()
-        
         # Save results
         output_file = Path("results/halftime_detection/single_request_analysis.txt")
         output_file.parent.mkdir(parents=True, exist_ok=True)
@@ -171,17 +322,17 @@ CLIPS TO ANALYZE:
             f.write(f"SINGLE REQUEST SYNTHESIS RESULTS\n")
             f.write(f"Generated: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
             f.write(f"Model: Gemini 2.5 Pro\n")
-            f.write(f"Input clips: {len(description_files)}\n")
+            f.write(f"Input clips: {sum(len(group) for group in groups)} of {len(description_files)}\n")
             f.write(f"Text size: {total_chars:,} characters ({total_chars/1024/1024:.1f} MB)\n")
             f.write(f"Processing time: {processing_time:.1f} seconds\n")
             f.write("\n" + "="*80 + "\n\n")
-            f.write(response.text)
+            f.write(response_text)
         
         print(f"📁 Results saved to: {output_file}")
         print()
         print("🎯 ANALYSIS RESULTS:")
         print("=" * 50)
-        print(response.text)
+        print(response_text)
         
     except Exception as e:
         print(f"❌ ERROR: {e}")
@@ -5,12 +5,30 @@ Video clips → Text descriptions of kickouts
 """
 
 import os
+import sys
+import re
 import time
+import json
+import queue
+import asyncio
+import threading
+import hashlib
+import functools
+import argparse
+import subprocess
+import datetime
 import google.generativeai as genai
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor
+from typing_extensions import TypedDict, NotRequired
 from dotenv import load_dotenv
 
+# Helpers shared by all stages live in gaa_common/ at the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from gaa_common.llm_cache import LLMCache, make_key
+from gaa_common.throttle import async_with_retry, AsyncAdaptiveLimit
+from results_db import open_results_db, analyzed_clips, save_analyses, kickout_timestamps
+
 # Load environment variables
 load_dotenv()
 
@@ -20,118 +38,496 @@ if not GEMINI_API_KEY:
     raise ValueError("GEMINI_API_KEY environment variable not set")
 genai.configure(api_key=GEMINI_API_KEY)
 
-def analyze_clip_for_kickouts(clip_path, timestamp, half_name):
-    """Analyze a single clip for GAA kickouts"""
-    try:
-        # Upload video to Gemini
-        video_file = genai.upload_file(path=clip_path)
-        
-        # Wait for processing
-        while video_file.state.name == "PROCESSING":
-            time.sleep(1)
-            video_file = genai.get_file(video_file.name)
-        
-        if video_file.state.name == "FAILED":
-            return f"❌ Failed to process {clip_path}"
-        
-        # GAA kickout analysis prompt - ULTRA STRICT
-        prompt = f"""
-        You are an expert GAA analyst watching a 15-second clip from the {half_name} at {timestamp}.
-
-        CRITICAL: GAA KICKOUTS ARE EXTREMELY RARE EVENTS. In a typical GAA match, there are only 15-25 kickouts in the ENTIRE 70+ minute game. In the first 10 minutes, expect 0-3 maximum.
-
-        GOAL: Detect ONLY GENUINE OFFICIAL GAA KICKOUTS. When in doubt, always say NO.
-
-        MANDATORY KICKOUT SEQUENCE (ALL MUST BE CLEARLY VISIBLE):
-        1. TRIGGER: You must SEE the ball going out of play (shot wide/over/saved)
-        2. COMPLETE STOPPAGE: All play stops, referee signals
-        3. AREA CLEARANCE: All outfield players deliberately exit the 20m area
-        4. FIELD SPREAD: Players spread to midfield/opposition half
-        5. GROUND PLACEMENT: Goalkeeper places ball on ground at 20m line
-        6. STRUCTURED KICK: Goalkeeper takes run-up, kicks from stationary ball
-        7. AERIAL CONTEST: Multiple players contest high ball
-
-        ULTRA-STRICT CRITERIA (MISSING ANY = NO KICKOUT):
-        ✓ You can SEE the trigger event (ball going out) in THIS clip
-        ✓ COMPLETE play stoppage visible (not during active play)
-        ✓ ALL players have CLEARED the 20-meter area completely
-        ✓ Players are SPREAD across the entire field (not bunched up)
-        ✓ Ball is placed on GROUND (not kicked from hands)
-        ✓ Clear PAUSE and setup time (not immediate clearance)
-        ✓ Goalkeeper takes PROPER run-up from behind ball
-        ✓ Multiple players contest the HIGH aerial ball
-        ✓ This is MATCH PLAY not warm-up/training
-
-        ABSOLUTELY NEVER DETECT:
-        - Warm-up kicks or training drills
-        - Goalkeeper clearances during active play
-        - Any kick from hands
-        - Quick clearances without setup
-        - Free kicks, sideline kicks, or other restarts
-        - Shots or passes during active play
-        - Any kick when players haven't fully cleared area
-        - Throw-ins or any other restart
-        - If you can't see the trigger event that caused it
-        
-        **OUTPUT FORMAT:**
-        KICKOUT: [YES/NO]
-        CONFIDENCE: [1-10]
-        HALF: {half_name}
-        CLIP_TIME: {timestamp}
-        
-        IF KICKOUT = YES:
-        TRIGGER_EVENT: [What caused it]
-        EXACT_CONTACT_TIME: [X.X seconds when foot touches ball]
-        KICKING_TEAM: [Team A/Team B based on goalkeeper jersey]
-        PLAYER_POSITIONING: [Did players clear and spread? YES/NO]
-        
-        KICK_ANALYSIS:
-        KICK_DISTANCE: [Short/Medium/Long]
-        KICK_DIRECTION: [Left/Center/Right]
-        KICK_ACCURACY: [On target/Off target/Contested]
-        
-        POSSESSION_OUTCOME:
-        POSSESSION_WON_BY: [Team A/Team B/Contested/Unclear]
-        POSSESSION_LOCATION: [Field position where caught]
-        NEXT_ACTION: [What happened after possession]
-        
-        JERSEY_COLORS:
-        TEAM_A_COLORS: [Describe colors]
-        TEAM_B_COLORS: [Describe colors]
-        GOALKEEPER_JERSEY: [Color of kicking goalkeeper]
-        
-        TACTICAL_CONTEXT: [Full sequence description]
+# Persistent response cache so re-runs skip clips already analyzed
+llm_cache = LLMCache()
+
+# Clip files are named clip_<minutes>m<seconds>s
+CLIP_NAME_PATTERN = re.compile(r'clip_(\d+)m(\d+)s')
+
+# Flash screens every clip; Pro re-checks only possible kickouts and unsure negatives
+SCREEN_MODEL_NAME = "gemini-2.5-flash"
+MODEL_NAME = "gemini-2.5-pro"
+REVIEW_BELOW_CONFIDENCE = 7  # Override with --review-below
 
-        IF KICKOUT = NO:
-        REASONING: [Why not an official kickout]
+# GAA kickout analysis instructions - ULTRA STRICT (static, sent as system instruction)
+KICKOUT_INSTRUCTIONS = """
+        You are an expert GAA analyst watching 15-second clips. The half and clip time are given with each clip.
 
-        REMEMBER: 
-        - GAA kickouts are EXTREMELY RARE - only 2-3 in first 10 minutes maximum
-        - When in doubt, ALWAYS say NO
-        - Must see COMPLETE sequence from trigger to aerial contest
-        - This is MATCH PLAY not training/warm-up
-        - Be ULTRA-CONSERVATIVE in detection
+        GOAL: Detect ONLY genuine official GAA kickouts. They are EXTREMELY RARE (15-25 per 70+ minute match, 0-3 in the first 10 minutes). When in doubt, say NO.
+
+        A clip is a kickout ONLY if ALL of these are clearly visible in THIS clip, during match play (not warm-up/training):
+        1. TRIGGER: the ball goes out of play (shot wide/over/saved)
+        2. STOPPAGE: play completely stops
+        3. CLEARANCE: all outfield players leave the 20m area and spread across the field
+        4. PLACEMENT: the goalkeeper places the ball on the ground at the 20m line (never a kick from hands)
+        5. SETUP: a clear pause, then a proper run-up and kick from the stationary ball
+        6. CONTEST: multiple players contest the high aerial ball
+
+        Anything else is NO - e.g. clearances or kicks during active play, quick kicks without setup, free kicks, sideline kicks, throw-ins and other restarts.
+
+        **OUTPUT FORMAT:**
+        Answer in JSON following the response schema, one object per clip:
+        - clip: the clip's number as given with it
+        - kickout: true/false
+        - confidence: 1-10
+        - reasoning: ONE short sentence on why it is / is not an official kickout
+
+        Only when kickout is true, also fill in:
+        - trigger_event: what caused it
+        - exact_contact_time: seconds into the clip when the foot touches the ball
+        - kicking_team: "Team A" or "Team B" based on goalkeeper jersey
+        - players_cleared_and_spread: did players clear the area and spread?
+        - kick_distance: "Short", "Medium" or "Long"
+        - kick_direction: "Left", "Center" or "Right"
+        - kick_accuracy: "On target", "Off target" or "Contested"
+        - possession_won_by: "Team A", "Team B", "Contested" or "Unclear"
+        - possession_location: field position where caught
+        - next_action: what happened after possession
+        - team_a_colors, team_b_colors, goalkeeper_jersey: jersey colors
+        - tactical_context: full sequence description
         """
-        
-        # Generate analysis
-        model = genai.GenerativeModel("gemini-2.5-pro")
-        response = model.generate_content([video_file, prompt])
-        
-        # Clean up
-        genai.delete_file(video_file.name)
-        
-        return response.text
-        
-    except Exception as e:
-        return f"❌ Error analyzing {clip_path}: {str(e)}"
+
+class KickoutAnalysis(TypedDict):
+    """Per-clip answer; the YES-only fields are left out when there is no kickout"""
+    clip: int
+    kickout: bool
+    confidence: int
+    reasoning: str
+    trigger_event: NotRequired[str]
+    exact_contact_time: NotRequired[float]
+    kicking_team: NotRequired[str]
+    players_cleared_and_spread: NotRequired[bool]
+    kick_distance: NotRequired[str]
+    kick_direction: NotRequired[str]
+    kick_accuracy: NotRequired[str]
+    possession_won_by: NotRequired[str]
+    possession_location: NotRequired[str]
+    next_action: NotRequired[str]
+    team_a_colors: NotRequired[str]
+    team_b_colors: NotRequired[str]
+    goalkeeper_jersey: NotRequired[str]
+    tactical_context: NotRequired[str]
+
+# Structured output: no labels/prose to generate, and no regex parsing downstream
+GENERATION_CONFIG = genai.GenerationConfig(
+    response_mime_type="application/json",
+    response_schema=list[KickoutAnalysis],
+)
+
+# Several clips share one request; the answer has one object per numbered clip
+CLIPS_PER_REQUEST = 4
+
+# --silence-prefilter: a kickout needs a stoppage, which shows up as quiet audio
+SILENCE_FILTER = "silencedetect=n=-30dB:d=0.5"
+MIN_SILENT_SECONDS = 1.0
+SILENCE_DURATION_PATTERN = re.compile(r'silence_duration: ([\d.]+)')
+
+# --proxy-clips: low-bitrate copies are enough to spot a kickout and upload far faster
+PROXY_DIR = Path(".cache/proxies")
+PROXY_FFMPEG_ARGS = ['-vf', 'scale=-2:480', '-r', '15', '-b:v', '500k', '-an']
+
+# Clips up to this size are sent inline, skipping the File API upload + processing wait
+# (a full group stays under Gemini's 20MB request limit after base64 encoding)
+INLINE_MAX_BYTES = 3 * 1024 * 1024
+
+# Clip content hash -> Gemini file name + upload time, so identical clips are only uploaded once
+UPLOADS_MANIFEST = Path(".cache/uploads.json")
+UPLOAD_REUSE_SECONDS = 47 * 3600  # Gemini deletes uploads after 48h
+CLEANUP_AFTER = datetime.timedelta(hours=24)  # Age at which --cleanup-uploads deletes a file
+try:
+    uploads = json.loads(UPLOADS_MANIFEST.read_text()) if UPLOADS_MANIFEST.exists() else {}
+except json.JSONDecodeError:
+    uploads = {}  # Left half-written by an older run; uploads are simply redone
+uploads = {digest: entry for digest, entry in uploads.items() if isinstance(entry, dict)}
+
+def save_uploads():
+    """Write the upload manifest atomically, so a crash mid-write can't lose it"""
+    UPLOADS_MANIFEST.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = UPLOADS_MANIFEST.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(uploads, indent=2))
+    os.replace(tmp_path, UPLOADS_MANIFEST)
+
+def create_kickout_model(model_name):
+    """Model with the kickout criteria as its system instruction (a stable prefix for implicit caching)"""
+    return genai.GenerativeModel(model_name, system_instruction=KICKOUT_INSTRUCTIONS)
+
+def clip_timestamp(clip_name):
+    """Extract timestamp from clip name (clip_15m30s.mp4 -> 15:30)"""
+    match = CLIP_NAME_PATTERN.match(clip_name)
+    if not match:
+        raise ValueError(f"Unrecognized clip name: {clip_name}")
+    return f"{match.group(1)}:{match.group(2)}"
+
+@functools.lru_cache(maxsize=None)
+def clip_digest(clip_path):
+    """Content hash of a clip, streamed so the whole video is never in memory (once per run)"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(clip_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+async def response_cache_key(model, prompt, clip_path):
+    """Response cache key for one clip; reuses the clip's content hash instead of re-reading it"""
+    digest = await asyncio.to_thread(clip_digest, clip_path)
+    return make_key(model.model_name, f"{KICKOUT_INSTRUCTIONS}{prompt}|clip:{digest}")
+
+async def wait_for_processing(video_file):
+    """Poll an upload until Gemini has finished processing it"""
+    # Back off from a short first check
+    delay = 0.2
+    while video_file.state.name == "PROCESSING":
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 5)
+        video_file = await asyncio.to_thread(genai.get_file, video_file.name)
+    return video_file
+
+async def upload_clip(clip_path):
+    """Upload a clip to Gemini, reusing an upload of the same bytes (even one still processing)"""
+    # Hashing and the SDK file calls are blocking, so run them off the loop
+    digest = await asyncio.to_thread(clip_digest, clip_path)
+    entry = uploads.get(digest)
+    
+    # Entries near the 48h expiry are re-uploaded without a get_file round-trip
+    if entry and time.time() - entry["uploaded_at"] < UPLOAD_REUSE_SECONDS:
+        try:
+            # An upload a crashed run left processing is resumed rather than redone
+            video_file = await wait_for_processing(await asyncio.to_thread(genai.get_file, entry["name"]))
+            if video_file.state.name == "ACTIVE":
+                return video_file
+        except Exception:
+            pass  # Deleted early - upload again
+    
+    video_file = await async_with_retry(asyncio.to_thread, genai.upload_file, path=clip_path)
+    
+    # Recorded before processing finishes, so a crash while waiting doesn't waste the upload.
+    # Replaced uploads stay listed until --cleanup-uploads deletes them.
+    # Manifest is only touched from the event loop thread, so no lock is needed
+    superseded = (entry.get("superseded", []) + [entry["name"]]) if entry else []
+    uploads[digest] = {"name": video_file.name, "uploaded_at": time.time(), "superseded": superseded}
+    save_uploads()
+    
+    video_file = await wait_for_processing(video_file)
+    if video_file.state.name != "ACTIVE":
+        # Never reused, but kept listed so the sweep still deletes it
+        uploads[digest]["uploaded_at"] = 0
+        save_uploads()
+    
+    return video_file
+
+async def clip_part(clip_path):
+    """Request part for a clip: inline bytes if small, else an ACTIVE upload (None if it failed)"""
+    if os.path.getsize(clip_path) <= INLINE_MAX_BYTES:
+        data = await asyncio.to_thread(Path(clip_path).read_bytes)
+        return {"mime_type": "video/mp4", "data": data}
+    
+    # Upload video to Gemini (or reuse an earlier upload)
+    video_file = await upload_clip(clip_path)
+    return video_file if video_file.state.name == "ACTIVE" else None
+
+async def analyze_clip_for_kickouts(clip_path, timestamp, half_name, model, generate_slots):
+    """Analyze a single clip for GAA kickouts (generation bounded by the generate_slots limit)
+    
+    Raises on failure, so an error is never stored as if it were an analysis.
+    """
+    # Per-clip part of the prompt; the static criteria are the system instruction
+    prompt = f"HALF: {half_name}\nCLIP_TIME: {timestamp}"
+    
+    # Reuse a previous response for this exact clip + prompt if we have one
+    cache_key = await response_cache_key(model, prompt, clip_path)
+    cached = llm_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    video_part = await clip_part(clip_path)
+    
+    if video_part is None:
+        raise RuntimeError(f"Gemini failed to process {clip_path}")
+    
+    # Generate analysis (transient errors are retried, anything else propagates)
+    response = await async_with_retry(generate_slots.run, model.generate_content_async,
+                                      ["CLIP 1", video_part, prompt], generation_config=GENERATION_CONFIG)
+    analysis = clip_analyses(response.text).get(1)
+    if analysis is None:
+        raise RuntimeError(f"No analysis returned for {clip_path}")
+    llm_cache.set(cache_key, analysis)
+    
+    # Uploads are kept for reuse on re-runs; Gemini expires them after 48h
+    return analysis
+
+def clip_analyses(response_text):
+    """Map a JSON response to {clip number: that clip's analysis as JSON text}"""
+    analyses = {}
+    for item in json.loads(response_text):
+        clip = item.pop("clip", None)
+        if isinstance(clip, int):
+            analyses[clip] = json.dumps(item)
+    return analyses
+
+async def analyze_clip_group(clips, half_name, model, generate_slots):
+    """Analyze (clip_path, timestamp) pairs in one request -> one result (or exception) per clip, in order"""
+    prompts = [f"HALF: {half_name}\nCLIP_TIME: {timestamp}" for _, timestamp in clips]
+    
+    # Same cache keys as single-clip requests, so either path can reuse the other's answers
+    cache_keys = await asyncio.gather(*(
+        response_cache_key(model, prompt, clip_path)
+        for (clip_path, _), prompt in zip(clips, prompts)
+    ))
+    results = [llm_cache.get(key) for key in cache_keys]
+    todo = [i for i, result in enumerate(results) if result is None]
+    
+    if len(todo) > 1:
+        try:
+            video_parts = await asyncio.gather(*(clip_part(clips[i][0]) for i in todo))
+            todo = [i for i, video_part in zip(todo, video_parts) if video_part is not None]
+            video_parts = [video_part for video_part in video_parts if video_part is not None]
+            
+            contents = []
+            for n, (i, video_part) in enumerate(zip(todo, video_parts), 1):
+                contents += [f"CLIP {n}", video_part, prompts[i]]
+            contents.append(f"Analyze each of the {len(todo)} clips above separately, one object per clip.")
+            
+            response = await async_with_retry(generate_slots.run, model.generate_content_async,
+                                              contents, generation_config=GENERATION_CONFIG)
+            
+            sections = clip_analyses(response.text)
+            for n, i in enumerate(todo, 1):
+                if sections.get(n):
+                    results[i] = sections[n]
+                    llm_cache.set(cache_keys[i], results[i])
+        except Exception as e:
+            print(f"⚠️  Multi-clip request failed ({e}), analyzing clips one by one")
+    
+    # Clips the group answer missed (or that failed to upload) get their own request
+    missing = [i for i, result in enumerate(results) if result is None]
+    singles = await asyncio.gather(*(
+        analyze_clip_for_kickouts(clips[i][0], clips[i][1], half_name, model, generate_slots)
+        for i in missing
+    ), return_exceptions=True)
+    for i, result in zip(missing, singles):
+        results[i] = result
+    
+    return results
+
+WRITE_BATCH_SIZE = 32  # Most rows the writer commits in one transaction
+PROGRESS_SECONDS = 5  # Progress is printed at most this often, not per clip
+
+def write_results(write_queue, output_dir):
+    """Writer thread: store queued analyses in the results database until the None sentinel"""
+    # The connection is opened here so it is only ever used from this thread
+    conn = open_results_db(output_dir)
+    done = False
+    while not done:
+        # Block for one row, then take whatever else is already queued as one transaction
+        rows = [write_queue.get()]
+        while len(rows) < WRITE_BATCH_SIZE and not write_queue.empty():
+            rows.append(write_queue.get_nowait())
+        if None in rows:
+            done = True
+            rows = rows[:rows.index(None)]
+        if not rows:
+            continue
+        try:
+            save_analyses(conn, rows)
+        except Exception as e:
+            print(f"❌ Error saving {', '.join(row[0] for row in rows)}: {e}")
+    conn.close()
+
+def save_result(write_queue, video_file, timestamp, result):
+    """Queue one clip's analysis for the writer thread"""
+    write_queue.put((video_file.stem, "first_half", timestamp, video_file.name, result))
+
+def needs_review(result):
+    """True if a screening answer should be re-checked by the stronger model"""
+    try:
+        analysis = json.loads(result)
+    except (TypeError, json.JSONDecodeError):
+        return True  # Screening failed for this clip
+    return analysis.get("kickout", True) or analysis.get("confidence", 0) < REVIEW_BELOW_CONFIDENCE
+
+async def analyze_clip_group_cascade(clips, half_name, screen, review):
+    """Screen clips with the fast model, re-asking the stronger model only where needed"""
+    results = await analyze_clip_group(clips, half_name, *screen)
+    
+    flagged = [i for i, result in enumerate(results) if needs_review(result)]
+    if flagged:
+        reviewed = await analyze_clip_group([clips[i] for i in flagged], half_name, *review)
+        for i, result in zip(flagged, reviewed):
+            # A failed review keeps a usable screening answer rather than losing the clip
+            if not isinstance(result, Exception) or isinstance(results[i], Exception):
+                results[i] = result
+    
+    return results
+
+async def run_all(pending, output_dir, initial_concurrency, max_concurrency, cascade=True, sources=None):
+    """Analyze all pending clips on one event loop, with an adaptive limit on requests generating
+    
+    sources optionally maps a clip to the file actually sent to Gemini (e.g. its proxy).
+    """
+    sources = sources or {}
+    # Twice as many groups as generation slots may be in the pipeline, so the
+    # next clips' uploads run while earlier clips are still generating
+    pipeline_slots = asyncio.Semaphore(max_concurrency * 2)
+    # Probe each model's rate limit: start low, add a slot per success, halve on 429
+    review_model = create_kickout_model(MODEL_NAME)
+    review = (review_model, AsyncAdaptiveLimit(initial_concurrency, max_concurrency))
+    if cascade:
+        screen_model = create_kickout_model(SCREEN_MODEL_NAME)
+        screen = (screen_model, AsyncAdaptiveLimit(initial_concurrency, max_concurrency))
+    
+    async def bounded(group):
+        clips = [(str(sources.get(video_file, video_file)), timestamp) for video_file, timestamp in group]
+        async with pipeline_slots:
+            try:
+                if cascade:
+                    results = await analyze_clip_group_cascade(clips, "first_half", screen, review)
+                else:
+                    results = await analyze_clip_group(clips, "first_half", *review)
+            except Exception as e:
+                results = [e] * len(group)
+        return [(video_file, timestamp, result) for (video_file, timestamp), result in zip(group, results)]
+    
+    # Disk writes happen on one background thread so they never stall the loop
+    write_queue = queue.Queue()
+    writer = threading.Thread(target=write_results, args=(write_queue, output_dir), daemon=True)
+    writer.start()
+    
+    groups = [pending[i:i + CLIPS_PER_REQUEST] for i in range(0, len(pending), CLIPS_PER_REQUEST)]
+    tasks = [bounded(group) for group in groups]
+    start_time = time.time()
+    last_report = start_time
+    finished = 0  # Clips done either way, so the last report always prints
+    failed = 0
+    
+    # Save each group's results as soon as it finishes, whatever order that is
+    for task in asyncio.as_completed(tasks):
+        for video_file, timestamp, result in await task:
+            finished += 1
+            if isinstance(result, Exception):
+                # Not saved, so the clip is picked up again on the next run
+                print(f"❌ Error processing {video_file}: {result}")
+                failed += 1
+            else:
+                save_result(write_queue, video_file, timestamp, result)
+            
+            now = time.time()
+            if now - last_report < PROGRESS_SECONDS and finished < len(pending):
+                continue
+            last_report = now
+            progress = (finished / len(pending)) * 100
+            elapsed = now - start_time
+            rate = finished / elapsed if elapsed > 0 else 0
+            
+            print(f"📈 Progress: {finished}/{len(pending)} ({progress:.1f}%, {failed} failed) | "
+                  f"Rate: {rate:.1f} clips/s")
+    
+    # Flush remaining writes before returning
+    write_queue.put(None)
+    await asyncio.to_thread(writer.join)
+
+def silent_seconds(clip_path):
+    """Seconds of near-silence in a clip (ffmpeg silencedetect), or None if it can't be measured"""
+    cmd = ['ffmpeg', '-hide_banner', '-nostats', '-i', str(clip_path),
+           '-af', SILENCE_FILTER, '-f', 'null', '-']
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None  # e.g. no audio stream
+    return sum(float(d) for d in SILENCE_DURATION_PATTERN.findall(result.stderr))
+
+def filter_by_silence(clips):
+    """Drop clips with too little silence to contain a play stoppage (unmeasurable clips are kept)"""
+    # ffmpeg runs as a separate process, so threads are enough to use every core
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        silences = list(executor.map(silent_seconds, clips))
+    return [clip for clip, silence in zip(clips, silences)
+            if silence is None or silence >= MIN_SILENT_SECONDS]
+
+def make_proxy(clip_path):
+    """480p/15fps/500kbps silent copy of a clip, made once and kept in PROXY_DIR (original on failure)"""
+    # Keyed by content: clip names repeat across matches, so a name alone could reuse another match's proxy
+    proxy_path = PROXY_DIR / f"{Path(clip_path).stem}_{clip_digest(str(clip_path))}_480p.mp4"
+    if proxy_path.exists():
+        return proxy_path
+    
+    PROXY_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = proxy_path.with_suffix(".tmp.mp4")
+    cmd = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error', '-i', str(clip_path),
+           *PROXY_FFMPEG_ARGS, str(tmp_path)]
+    try:
+        subprocess.run(cmd, capture_output=True, check=True, timeout=120)
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"⚠️  Could not transcode {clip_path}, sending original: {e}")
+        return Path(clip_path)
+    
+    # Rename only once complete, so an interrupted transcode is never reused
+    tmp_path.replace(proxy_path)
+    return proxy_path
+
+def cleanup_uploads():
+    """Delete this stage's Gemini uploads older than CLEANUP_AFTER in one sweep (uploads are not deleted per clip)"""
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - CLEANUP_AFTER
+    # Only files recorded in our manifest (current or replaced); other stages share the project's file storage
+    ours = {name for entry in uploads.values() for name in [entry["name"], *entry.get("superseded", [])]}
+    deleted = set()
+    remaining = set()  # Ours and still stored (Gemini itself drops files after 48h)
+    
+    for video_file in genai.list_files():
+        if video_file.name not in ours:
+            continue
+        remaining.add(video_file.name)
+        if video_file.create_time < cutoff:
+            try:
+                genai.delete_file(video_file.name)
+                deleted.add(video_file.name)
+                remaining.discard(video_file.name)
+            except Exception as e:
+                print(f"⚠️  Could not delete {video_file.name}: {e}")
+    
+    # Forget deleted or expired replaced uploads, and entries whose upload was deleted;
+    # an entry stays while any of its replaced uploads failed to delete
+    for digest, entry in list(uploads.items()):
+        entry["superseded"] = [name for name in entry.get("superseded", []) if name in remaining]
+        if entry["name"] in deleted:
+            if entry["superseded"]:
+                entry["uploaded_at"] = 0
+            else:
+                uploads.pop(digest)
+    if UPLOADS_MANIFEST.exists():
+        save_uploads()
+    
+    print(f"🧹 Deleted {len(deleted)} uploads older than {CLEANUP_AFTER}")
 
 def main():
-    print("🥅 GAA KICKOUT ANALYSIS - STEP 1: VIDEO → TEXT (GEMINI 2.5 PRO)")
+    global REVIEW_BELOW_CONFIDENCE
+    parser = argparse.ArgumentParser(description='Analyze clips for GAA kickouts')
+    parser.add_argument('--cleanup-uploads', action='store_true',
+                       help="Delete this stage's Gemini uploads older than 24h and exit (e.g. from a nightly cron job)")
+    parser.add_argument('--silence-prefilter', action='store_true',
+                       help='Skip clips with under 1s of silence (no stoppage, so no kickout) before calling Gemini')
+    parser.add_argument('--no-cascade', action='store_true',
+                       help=f'Analyze every clip with {MODEL_NAME} instead of screening with {SCREEN_MODEL_NAME} first')
+    parser.add_argument('--review-below', type=int, default=REVIEW_BELOW_CONFIDENCE,
+                       help='Re-check screened NO answers below this confidence (kickouts are always re-checked)')
+    parser.add_argument('--proxy-clips', action='store_true',
+                       help='Send 480p/15fps/500kbps silent copies of the clips instead of the originals (needs ffmpeg)')
+    args = parser.parse_args()
+    
+    REVIEW_BELOW_CONFIDENCE = args.review_below
+    
+    if args.cleanup_uploads:
+        cleanup_uploads()
+        return
+    
+    print("🥅 GAA KICKOUT ANALYSIS - STEP 1: VIDEO → TEXT (GEMINI 2.5 FLASH → PRO)")
     print("=" * 60)
     
     # Configuration
     TIME_LIMIT_MINUTES = 10  # Analyze first 10 minutes
-    MAX_WORKERS = 4  # Reduced for Pro model (slower but higher quality)
+    INITIAL_CONCURRENCY = 8  # Gemini requests generating at first
+    MAX_CONCURRENCY = 40  # Upper bound as the limit adapts to the rate limit
     
     # Setup paths
     clips_base = Path("../3.5-video-splitting/clips/first_half")
@@ -142,73 +538,62 @@ def main():
         print(f"❌ Clips directory not found: {clips_base}")
         return
     
-    # Find clips for specified time period
-    all_clips = sorted(clips_base.glob("*.mp4"))
-    target_clips = []
-    
-    for clip in all_clips:
-        if "clip_" in clip.name:
-            parts = clip.stem.replace("clip_", "").split("m")
-            if len(parts) >= 1:
-                try:
-                    minutes = int(parts[0])
-                    if minutes < TIME_LIMIT_MINUTES:
-                        target_clips.append(clip)
-                except ValueError:
-                    continue
+    # Find clips for specified time period (name and minute filtered in one pass)
+    with os.scandir(clips_base) as entries:
+        target_clips = []
+        for entry in entries:
+            match = CLIP_NAME_PATTERN.match(entry.name)
+            if match and entry.name.endswith(".mp4") and int(match.group(1)) < TIME_LIMIT_MINUTES:
+                target_clips.append(entry.path)
+    target_clips = [Path(path) for path in sorted(target_clips)]
     
     print(f"📊 Found {len(target_clips)} clips in first {TIME_LIMIT_MINUTES} minutes")
-    print(f"🧵 Using {MAX_WORKERS} threads for processing")
+    print(f"⚡ {INITIAL_CONCURRENCY}-{MAX_CONCURRENCY} requests in flight (adaptive), {CLIPS_PER_REQUEST} clips per request")
     
-    # Process clips in parallel
-    start_time = time.time()
-    completed = 0
+    # Work out which clips still need analysis (one query instead of a stat per clip)
+    conn = open_results_db(output_dir)
+    done = analyzed_clips(conn)
+    conn.close()
+    pending = []
     
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = []
+    for video_file in target_clips:
+        # Skip if already processed
+        if video_file.stem in done:
+            print(f"⏭️  Skipping {video_file.name} (already processed)")
+            continue
         
-        for video_file in target_clips:
-            # Skip if already processed
-            output_file = output_dir / f"{video_file.stem}.txt"
-            if output_file.exists():
-                print(f"⏭️  Skipping {video_file.name} (already processed)")
-                continue
-            
-            # Extract timestamp from filename
-            timestamp = video_file.stem.replace('clip_', '').replace('m', ':').replace('s', '')
-            
-            future = executor.submit(analyze_clip_for_kickouts, str(video_file), timestamp, "first_half")
-            futures.append((future, video_file, timestamp))
-        
-        # Collect results with progress
-        for future, video_file, timestamp in futures:
-            try:
-                result = future.result()
-                
-                # Save result
-                output_file = output_dir / f"{video_file.stem}.txt"
-                with open(output_file, 'w') as f:
-                    f.write(f"HALF: first_half\n")
-                    f.write(f"TIMESTAMP: {timestamp}\n")
-                    f.write(f"CLIP_FILE: {video_file.name}\n")
-                    f.write(f"ANALYSIS:\n{result}\n")
-                
-                completed += 1
-                progress = (completed / len(futures)) * 100 if futures else 0
-                elapsed = time.time() - start_time
-                rate = completed / elapsed if elapsed > 0 else 0
-                
-                print(f"📈 Progress: {completed}/{len(futures)} ({progress:.1f}%) | "
-                      f"Rate: {rate:.1f} clips/s")
-                
-            except Exception as e:
-                print(f"❌ Error processing {video_file}: {e}")
+        pending.append((video_file, clip_timestamp(video_file.stem)))
+    
+    if args.silence_prefilter and pending:
+        candidates = set(filter_by_silence([video_file for video_file, _ in pending]))
+        print(f"🔇 Silence pre-filter kept {len(candidates)}/{len(pending)} clips")
+        pending = [(video_file, timestamp) for video_file, timestamp in pending if video_file in candidates]
+    
+    # Process clips concurrently
+    start_time = time.time()
+    
+    sources = {}
+    if args.proxy_clips and pending:
+        # ffmpeg runs as a separate process, so threads are enough to use every core
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            proxies = executor.map(make_proxy, [video_file for video_file, _ in pending])
+            sources = dict(zip((video_file for video_file, _ in pending), proxies))
+        print(f"🗜️  Sending low-bitrate proxies (cached in {PROXY_DIR})")
+    
+    asyncio.run(run_all(pending, output_dir, INITIAL_CONCURRENCY, MAX_CONCURRENCY,
+                        cascade=not args.no_cascade, sources=sources))
     
     processing_time = time.time() - start_time
     
     print(f"\n✅ CLIP ANALYSIS COMPLETE!")
     print(f"⏱️  Time: {processing_time:.1f}s")
     print(f"📁 Results saved to: {output_dir}")
+    
+    # Quick summary straight from the database (only kickout rows come back)
+    conn = open_results_db(output_dir)
+    kickouts = kickout_timestamps(conn)
+    conn.close()
+    print(f"🥅 Kickouts flagged: {len(kickouts)}" + (f" at {', '.join(kickouts)}" if kickouts else ""))
     print(f"\n🔄 Next step: Run '2_synthesize_events.py' to create timeline")
 
 if __name__ == "__main__":
@@ -5,92 +5,104 @@ Text descriptions → Timeline JSON for webapp (GAA Events Schema)
 """
 
 import json
-import os
-import re
+import sys
+import argparse
+from collections import Counter
 from pathlib import Path
-import google.generativeai as genai
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
-# Load environment variables
+# Helpers shared by all stages live in gaa_common/ at the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from gaa_common.llm_cache import LLMCache, make_key
+from gaa_common.synthesis import (
+    get_synthesis_model, submit_batch, loads_json, write_json, extract_events_json, stream_response_text,
+)
+from results_db import RESULTS_DB_NAME, KICKOUT_CONDITION, open_results_db
+
+# Load environment variables (Gemini itself is configured on first use, so --help,
+# --no-ai and cached runs need no API key)
 load_dotenv()
 
-# Configure Gemini
-GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY environment variable not set")
-genai.configure(api_key=GEMINI_API_KEY)
+SYNTHESIS_MODEL_NAME = "gemini-2.5-pro"
+
+# Above this many kickouts, synthesis is split into windows sent in parallel and merged
+SHARD_MAX_CLIPS = 64
 
-def collect_analysis_results(analysis_dir):
-    """Collect all analysis results from the directory"""
+def collect_analysis_results(analysis_dir, kickouts_only=True):
+    """Collect analysis results from the results database (only kickouts unless kickouts_only=False)
+    
+    Returns None if nothing has been analysed yet; an empty list just means no kickouts.
+    """
     results = []
     
     analysis_dir = Path(analysis_dir)
-    if not analysis_dir.exists():
-        print(f"❌ Analysis directory not found: {analysis_dir}")
-        return results
+    if not (analysis_dir / RESULTS_DB_NAME).exists():
+        print(f"❌ Analysis database not found: {analysis_dir / RESULTS_DB_NAME}")
+        return None
     
-    analysis_files = sorted(analysis_dir.glob("*.txt"))
-    print(f"📋 Found {len(analysis_files)} analysis files")
+    conn = open_results_db(analysis_dir)
+    if not conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]:
+        conn.close()
+        print(f"❌ Analysis database is empty: {analysis_dir / RESULTS_DB_NAME}")
+        return None
+    
+    # Non-kickout clips carry no event data, so they are filtered out before being loaded
+    query = "SELECT clip_stem, half, timestamp, clip_file, analysis FROM results"
+    if kickouts_only:
+        query += f" WHERE {KICKOUT_CONDITION}"
+    rows = conn.execute(query).fetchall()
+    conn.close()
+    print(f"📋 Found {len(rows)} {'kickout ' if kickouts_only else ''}analyses")
     
-    for file_path in analysis_files:
+    for clip_stem, half, timestamp, clip_file, analysis in rows:
+        # Analyses are JSON objects; anything else is a recorded error message
         try:
-            with open(file_path, 'r') as f:
-                content = f.read()
-            
-            # Extract metadata from content
-            timestamp_match = re.search(r'TIMESTAMP: (\d+:\d+)', content)
-            clip_file_match = re.search(r'CLIP_FILE: (clip_\d+m\d+s\.mp4)', content)
-            
-            if timestamp_match and clip_file_match:
-                timestamp = timestamp_match.group(1)
-                minutes, seconds = map(int, timestamp.split(':'))
-                clip_start_time = minutes * 60 + seconds
-                
-                results.append({
-                    'file': file_path.name,
-                    'half': 'first_half',
-                    'clip_start_time': clip_start_time,
-                    'timestamp': timestamp,
-                    'clip_file': clip_file_match.group(1),
-                    'content': content
-                })
-                
-        except Exception as e:
-            print(f"⚠️  Error reading {file_path}: {e}")
+            parsed = loads_json(analysis)
+        except json.JSONDecodeError:
+            print(f"⚠️  Skipping {clip_stem}: {analysis[:80]}")
+            continue
+        
+        minutes, seconds = map(int, timestamp.split(':'))
+        clip_start_time = minutes * 60 + seconds
+        
+        results.append({
+            'file': clip_stem,
+            'half': half,
+            'clip_start_time': clip_start_time,
+            'timestamp': timestamp,
+            'clip_file': clip_file,
+            'analysis': parsed,
+            'content': analysis
+        })
     
     # Sort by time
     results.sort(key=lambda x: x['clip_start_time'])
     
     return results
 
-def synthesize_events_with_ai(analysis_results):
-    """Use Gemini 2.5 Pro to synthesize all analysis results into GAA Events Schema format"""
-    
-    # Prepare comprehensive prompt
-    all_analyses = ""
-    for result in analysis_results:
-        all_analyses += f"\n--- {result['timestamp']} (starts at {result['clip_start_time']}s) ---\n"
-        all_analyses += result['content']
-        all_analyses += "\n"
-    
-    prompt = f"""
-You are an expert GAA analyst synthesizing kickout data from {len(analysis_results)} clip analyses.
+# Static parts of the kickout synthesis prompt, built once; only the analyses,
+# clip count and (sharded) team mapping change per request
+SYNTHESIS_PROMPT_HEADER = """
+You are an expert GAA analyst synthesizing kickout data from {clip_count} clip analyses.
 
 TASK: Create GAA Events Schema compliant JSON for webapp consumption.
 
 ANALYSIS DATA:
-{all_analyses}
+"""
+
+SYNTHESIS_PROMPT_SCHEMA = """
 
 REQUIRED OUTPUT FORMAT (GAA Events Schema):
-{{
-  "match_info": {{
+{
+  "match_info": {
     "title": "GAA Match - Kickout Events",
     "description": "AI-detected kickout events with exact timing",
     "total_events": [number],
     "analysis_method": "AI video analysis"
-  }},
+  },
   "events": [
-    {{
+    {
       "id": "kickout_1",
       "time": [absolute seconds from match start],
       "team": "red" or "blue",
@@ -98,13 +110,13 @@ REQUIRED OUTPUT FORMAT (GAA Events Schema):
       "outcome": "Won" or "Lost" or "N/A",
       "autoGenerated": true,
       "validated": false
-    }}
+    }
   ]
-}}
+}
 
 SYNTHESIS REQUIREMENTS:
-1. Only include confirmed kickouts (KICKOUT: YES with confidence ≥7)
-2. Calculate absolute timing precisely (clip start time + exact contact time)
+1. Only include confirmed kickouts ("kickout": true with "confidence" ≥7)
+2. Calculate absolute timing precisely (clip start time + exact_contact_time)
 3. Map teams to "red" or "blue" based on jersey colors consistently
 4. Set outcome based on possession result:
    - "Won" if kicking team retained possession
@@ -118,7 +130,9 @@ TEAM MAPPING RULES:
 - Consistently map one team to "red" and other to "blue"
 - Maintain this mapping throughout all events
 - Base mapping on goalkeeper jersey colors mentioned
+"""
 
+SYNTHESIS_PROMPT_FOOTER = """
 IMPORTANT:
 - Use exact GAA Events Schema format
 - Calculate precise timing
@@ -128,30 +142,191 @@ IMPORTANT:
 
 Generate the complete JSON:
 """
+
+def build_synthesis_prompt(analysis_results, jersey_teams=None):
+    """Create the synthesis prompt for a set of analyses (with a fixed team mapping when sharded)"""
+    # Prepare comprehensive prompt (fragments joined once, not re-copied per clip)
+    parts = []
+    for result in analysis_results:
+        parts.append(f"\n--- {result['timestamp']} (starts at {result['clip_start_time']}s) ---\n")
+        parts.append(result['content'])
+        parts.append("\n")
+    all_analyses = "".join(parts)
+    
+    # Shards are synthesized separately, so they must agree on which jersey is which team
+    team_mapping = ""
+    if jersey_teams:
+        team_mapping = "- Use exactly this goalkeeper jersey colour → team mapping (shades count as the base colour): " + ", ".join(
+            f'"{jersey}" → {team}' for jersey, team in jersey_teams.items()
+        ) + "\n"
+    
+    return "".join([
+        SYNTHESIS_PROMPT_HEADER.format(clip_count=len(analysis_results)),
+        all_analyses,
+        SYNTHESIS_PROMPT_SCHEMA,
+        team_mapping,
+        SYNTHESIS_PROMPT_FOOTER,
+    ])
+
+def parse_synthesis(response_text):
+    """Parsed events JSON from a synthesis response, or None"""
+    event_data = extract_events_json(response_text) if response_text else None
+    if event_data is not None:
+        return event_data
+    print("❌ Could not extract JSON from AI response")
+    print("Raw response:", (response_text or "")[:500] + "...")
+    return None
+
+def merge_shard_events(shard_results):
+    """Reduce per-window event JSON into one timeline, renumbering the events in time order"""
+    events = sorted((event for result in shard_results for event in result.get('events', [])),
+                    key=lambda event: event.get('time', 0))
+    for n, event in enumerate(events, 1):
+        event['id'] = f"kickout_{n}"
+    
+    match_info = dict(shard_results[0].get('match_info', {}))
+    match_info['total_events'] = len(events)
+    return {"match_info": match_info, "events": events}
+
+def synthesize_events_with_ai(analysis_results, use_batch=False):
+    """Use Gemini 2.5 Pro to synthesize all analysis results into GAA Events Schema format"""
+    # Map: long matches are split into windows synthesized concurrently
+    shards = [analysis_results[i:i + SHARD_MAX_CLIPS] for i in range(0, len(analysis_results), SHARD_MAX_CLIPS)]
+    jersey_teams = map_jersey_teams(analysis_results) if len(shards) > 1 else None
+    prompts = [build_synthesis_prompt(shard, jersey_teams) for shard in shards]
     
     try:
-        print(f"🤖 Sending {len(analysis_results)} analyses to Gemini 2.5 Pro...")
-        print(f"📝 Prompt size: {len(prompt):,} characters")
+        print(f"🤖 Sending {len(analysis_results)} analyses to Gemini 2.5 Pro in {len(prompts)} request(s)...")
+        print(f"📝 Prompt size: {sum(len(prompt) for prompt in prompts):,} characters")
         
-        model = genai.GenerativeModel("gemini-2.5-pro")
-        response = model.generate_content(prompt)
+        # Unchanged analyses give an identical prompt, answered from the local cache
+        cache = LLMCache()
+        cache_keys = [make_key(SYNTHESIS_MODEL_NAME, prompt) for prompt in prompts]
+        responses = [cache.get(key) for key in cache_keys]
+        missing = [i for i, response_text in enumerate(responses) if response_text is None]
         
-        print(f"✅ AI synthesis complete! Response size: {len(response.text):,} characters")
+        if len(missing) < len(prompts):
+            print(f"💾 Using {len(prompts) - len(missing)} cached synthesis response(s) (analyses unchanged)")
         
-        # Extract JSON from response
-        json_match = re.search(r'\{.*\}', response.text, re.DOTALL)
-        if json_match:
-            json_text = json_match.group(0)
-            return json.loads(json_text)
+        if missing and use_batch:
+            fetched = submit_batch([prompts[i] for i in missing], SYNTHESIS_MODEL_NAME, "kickout-synthesis")
+        elif missing:
+            model = get_synthesis_model(SYNTHESIS_MODEL_NAME)
+            with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+                fetched = list(executor.map(lambda i: stream_response_text(model, prompts[i]), missing))
         else:
-            print("❌ Could not extract JSON from AI response")
-            print("Raw response:", response.text[:500] + "...")
+            fetched = []
+        
+        for i, response_text in zip(missing, fetched):
+            responses[i] = response_text
+        
+        print(f"✅ AI synthesis complete! Response size: {sum(len(r or '') for r in responses):,} characters")
+        
+        shard_results = [parse_synthesis(response_text) for response_text in responses]
+        
+        # Only parsed events are cached, so a bad or truncated reply is asked for again next run
+        for i in missing:
+            if shard_results[i] is not None:
+                cache.set(cache_keys[i], json.dumps(shard_results[i]))
+        
+        if None in shard_results:
             return None
+        
+        # Reduce: a single request needs no merging
+        if len(shard_results) == 1:
+            return shard_results[0]
+        return merge_shard_events(shard_results)
             
     except Exception as e:
         print(f"❌ AI synthesis failed: {e}")
         return None
 
+MIN_CONFIDENCE = 7
+WEBAPP_TEAMS = ["red", "blue"]
+
+# Base colours a goalkeeper jersey description is reduced to ("dark green" -> "green")
+JERSEY_COLOURS = [
+    "red", "blue", "green", "yellow", "white", "black", "orange", "maroon",
+    "navy", "purple", "gold", "grey", "sky", "pink",
+]
+
+def jersey_colour(jersey):
+    """Base colour of a jersey description: its first (main) colour word, else the description itself"""
+    words = jersey.strip().lower().replace("-", " ").replace("/", " ").split()
+    colours = [word for word in words if word in JERSEY_COLOURS]
+    return colours[0] if colours else " ".join(words)
+
+def map_jersey_teams(kickouts):
+    """Map goalkeeper jersey colours to webapp teams, one colour per team
+    
+    The two most frequent colours are the goalkeepers: a colour named after a team
+    gets that team, otherwise the team not yet taken. Rarer colours are left unmapped.
+    """
+    counts = Counter(
+        jersey_colour(result['analysis'].get('goalkeeper_jersey', '')) for result in kickouts
+    )
+    counts.pop("", None)
+    goalkeepers = [colour for colour, _ in counts.most_common(len(WEBAPP_TEAMS))]
+    
+    jersey_teams = {colour: colour for colour in goalkeepers if colour in WEBAPP_TEAMS}
+    free_teams = [team for team in WEBAPP_TEAMS if team not in jersey_teams.values()]
+    for colour in goalkeepers:
+        if colour not in jersey_teams:
+            jersey_teams[colour] = free_teams.pop(0)
+    return jersey_teams
+
+def build_events_from_analyses(analysis_results):
+    """Build GAA Events Schema JSON directly from the structured clip analyses (no Gemini call)"""
+    kickouts = [
+        result for result in analysis_results
+        if result['analysis'].get('kickout') and result['analysis'].get('confidence', 0) >= MIN_CONFIDENCE
+    ]
+    
+    jersey_teams = map_jersey_teams(kickouts)
+    
+    events = []
+    unmapped = Counter()
+    for result in kickouts:
+        analysis = result['analysis']
+        jersey = jersey_colour(analysis.get('goalkeeper_jersey', ''))
+        # A third colour or a missing jersey is most likely a misread; guessing a team would be silently wrong
+        if jersey not in jersey_teams:
+            unmapped[jersey or "(none)"] += 1
+            continue
+        kicking_team = analysis.get('kicking_team')
+        won_by = analysis.get('possession_won_by')
+        
+        if won_by == kicking_team:
+            outcome = "Won"
+        elif won_by in ("Team A", "Team B"):
+            outcome = "Lost"
+        else:
+            outcome = "N/A"
+        
+        events.append({
+            "id": f"kickout_{len(events) + 1}",
+            "time": round(result['clip_start_time'] + analysis.get('exact_contact_time', 0), 1),
+            "team": jersey_teams[jersey],
+            "action": "Kickout",
+            "outcome": outcome,
+            "autoGenerated": True,
+            "validated": False
+        })
+    
+    if unmapped:
+        print(f"⚠️  Skipped {sum(unmapped.values())} kickout(s) whose goalkeeper jersey matches neither team: "
+              + ", ".join(f"{jersey} ×{count}" for jersey, count in unmapped.items()))
+    
+    return {
+        "match_info": {
+            "title": "GAA Match - Kickout Events",
+            "description": "AI-detected kickout events with exact timing",
+            "total_events": len(events),
+            "analysis_method": "AI video analysis (deterministic synthesis)"
+        },
+        "events": events
+    }
+
 def validate_gaa_schema(event_data):
     """Validate the output against GAA Events Schema"""
     
@@ -208,8 +383,7 @@ def save_webapp_json(event_data, output_dir):
     
     # Save main webapp JSON
     webapp_json = output_dir / "kickout_events.json"
-    with open(webapp_json, 'w') as f:
-        json.dump(event_data, f, indent=2)
+    write_json(event_data, webapp_json)
     print(f"💾 Webapp JSON saved: {webapp_json}")
     
     # Save summary text
@@ -231,15 +405,24 @@ def save_webapp_json(event_data, output_dir):
         
         # List events
         f.write("Event Timeline:\n")
-        for event in event_data.get('events', []):
-            time_str = f"{event['time']//60:02.0f}:{event['time']%60:02.0f}"
-            f.write(f"  {time_str} - {event['team']} {event['action']} ({event['outcome']})\n")
+        f.writelines(
+            f"  {event['time']//60:02.0f}:{event['time']%60:02.0f} - "
+            f"{event['team']} {event['action']} ({event['outcome']})\n"
+            for event in event_data.get('events', [])
+        )
     
     print(f"📄 Summary saved: {summary_file}")
     
     return webapp_json
 
 def main():
+    parser = argparse.ArgumentParser(description='Synthesize kickout analyses into GAA Events Schema JSON')
+    parser.add_argument('--no-ai', action='store_true',
+                       help='Build the events directly from the structured clip analyses instead of asking Gemini')
+    parser.add_argument('--batch', action='store_true',
+                       help='Send the synthesis prompt through Gemini Batch Mode (~50%% cheaper, can take minutes)')
+    args = parser.parse_args()
+    
     print("🥅 GAA KICKOUT SYNTHESIS - STEP 2: TEXT → GAA EVENTS SCHEMA")
     print("=" * 60)
     
@@ -251,18 +434,27 @@ def main():
     print("📋 Collecting analysis results...")
     analysis_results = collect_analysis_results(analysis_dir)
     
-    if not analysis_results:
+    if analysis_results is None:
         print("❌ No analysis results found!")
         print(f"   Make sure to run '1_analyze_clips.py' first")
         return
     
-    print(f"✅ Found {len(analysis_results)} analysis files")
+    print(f"✅ Found {len(analysis_results)} kickout analyses")
     
-    # Synthesize with AI
-    print("🤖 Synthesizing events with Gemini 2.5 Pro...")
-    event_data = synthesize_events_with_ai(analysis_results)
+    if not analysis_results:
+        # No kickouts is a valid result: write an empty timeline rather than keep a stale one
+        print("ℹ️  No kickouts detected, writing an empty timeline")
+        event_data = build_events_from_analyses([])
+    elif args.no_ai:
+        # Filtering, timing and outcomes are plain field lookups on the clip JSON
+        print("⚙️  Building events from structured analyses (no Gemini call)...")
+        event_data = build_events_from_analyses(analysis_results)
+    else:
+        # Synthesize with AI
+        print("🤖 Synthesizing events with Gemini 2.5 Pro...")
+        event_data = synthesize_events_with_ai(analysis_results, use_batch=args.batch)
     
-    if not event_data:
+    if event_data is None:
         print("❌ Synthesis failed!")
         return
     
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+results_db.py - Kickout Analysis Results Store
+One SQLite table of per-clip analyses, shared by 1_analyze_clips.py and 2_synthesize_events.py
+"""
+
+import sqlite3
+from pathlib import Path
+
+RESULTS_DB_NAME = "results.db"
+
+# Rows whose analysis is valid JSON with "kickout": true, checked inside SQLite
+KICKOUT_CONDITION = "CASE WHEN json_valid(analysis) THEN json_extract(analysis, '$.kickout') END = 1"
+
+def open_results_db(output_dir):
+    """Open (creating if needed) the results database in output_dir"""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    conn = sqlite3.connect(output_dir / RESULTS_DB_NAME)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS results "
+        "(clip_stem TEXT PRIMARY KEY, half TEXT, timestamp TEXT, clip_file TEXT, analysis TEXT)"
+    )
+    conn.commit()
+    return conn
+
+def analyzed_clips(conn):
+    """Stems of all clips that already have an analysis"""
+    return {row[0] for row in conn.execute("SELECT clip_stem FROM results")}
+
+def save_analyses(conn, rows):
+    """Store (or replace) (clip_stem, half, timestamp, clip_file, analysis) rows in one transaction"""
+    conn.executemany(
+        "INSERT OR REPLACE INTO results (clip_stem, half, timestamp, clip_file, analysis) VALUES (?, ?, ?, ?, ?)",
+        rows
+    )
+    conn.commit()
+
+def kickout_timestamps(conn):
+    """Timestamps of clips analysed as kickouts, found inside SQLite without loading every analysis"""
+    rows = conn.execute(
+        f"SELECT timestamp FROM results WHERE {KICKOUT_CONDITION} ORDER BY clip_stem"
+    )
+    return [row[0] for row in rows]
@@ -5,12 +5,18 @@ Video clips → Text descriptions of turnovers/possession changes
 """
 
 import os
+import sys
+import re
 import time
 import google.generativeai as genai
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+# Helpers shared by all stages live in gaa_common/ at the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from gaa_common.throttle import with_retry, AdaptiveLimit
+
 # Load environment variables
 load_dotenv()
 
@@ -20,23 +26,17 @@ if not GEMINI_API_KEY:
     raise ValueError("GEMINI_API_KEY environment variable not set")
 genai.configure(api_key=GEMINI_API_KEY)
 
-def analyze_clip_for_turnovers(clip_path, timestamp, half_name):
-    """Analyze a single clip for GAA turnovers/possession changes"""
-    try:
-        # Upload video to Gemini
-        video_file = genai.upload_file(path=clip_path)
-        
-        # Wait for processing
-        while video_file.state.name == "PROCESSING":
-            time.sleep(1)
-            video_file = genai.get_file(video_file.name)
-        
-        if video_file.state.name == "FAILED":
-            return f"❌ Failed to process {clip_path}"
-        
-        # GAA turnover analysis prompt
-        prompt = f"""
-        You are an expert GAA analyst watching a 15-second clip from the {half_name} at {timestamp}.
+MODEL_NAME = "gemini-2.5-flash"
+
+# Clip files are named clip_<minutes>m<seconds>s
+CLIP_NAME_PATTERN = re.compile(r'clip_(\d+)m(\d+)s')
+
+# Progress is printed at most this often, not per clip
+PROGRESS_SECONDS = 5
+
+# GAA turnover analysis instructions (static, sent as system instruction)
+TURNOVER_INSTRUCTIONS = """
+        You are an expert GAA analyst watching a 15-second clip. The half and clip time are given with each clip.
 
         GOAL: Detect GAA TURNOVERS (possession changes) with precise timing.
 
@@ -69,8 +69,8 @@ def analyze_clip_for_turnovers(clip_path, timestamp, half_name):
         **OUTPUT FORMAT:**
         TURNOVER: [YES/NO]
         CONFIDENCE: [1-10]
-        HALF: {half_name}
-        CLIP_TIME: {timestamp}
+        HALF: [half given with the clip]
+        CLIP_TIME: [clip time given with the clip]
         
         IF TURNOVER = YES:
         TURNOVER_TYPE: [Interception/Tackle/Fumble/Block/Contest/Loose Ball/Steal]
@@ -106,18 +106,41 @@ def analyze_clip_for_turnovers(clip_path, timestamp, half_name):
         - Be specific about the exact moment possession changes
         - Distinguish between teams consistently by jersey colors
         """
+
+def create_turnover_model():
+    """Model with the turnover criteria as its system instruction (a stable prefix for implicit caching)"""
+    return genai.GenerativeModel(MODEL_NAME, system_instruction=TURNOVER_INSTRUCTIONS)
+
+# Built once and shared by all worker threads
+MODEL = create_turnover_model()
+
+def analyze_clip_for_turnovers(clip_path, timestamp, half_name, generate_slots):
+    """Analyze a single clip for GAA turnovers/possession changes (generation bounded by generate_slots)
+    
+    Raises on failure, so an error is never saved as if it were an analysis.
+    """
+    # Upload video to Gemini
+    video_file = with_retry(genai.upload_file, path=clip_path)
+    
+    try:
+        # Wait for processing
+        while video_file.state.name == "PROCESSING":
+            time.sleep(1)
+            video_file = genai.get_file(video_file.name)
         
-        # Generate analysis
-        model = genai.GenerativeModel("gemini-2.5-flash")
-        response = model.generate_content([video_file, prompt])
+        if video_file.state.name == "FAILED":
+            raise RuntimeError(f"Gemini failed to process {clip_path}")
         
-        # Clean up
-        genai.delete_file(video_file.name)
+        # Per-clip part of the prompt; the static criteria are the system instruction
+        prompt = f"HALF: {half_name}\nCLIP_TIME: {timestamp}"
         
+        # Generate analysis (rate limits shrink the concurrency limit, then are retried)
+        response = with_retry(generate_slots.run, MODEL.generate_content, [video_file, prompt])
         return response.text
-        
-    except Exception as e:
-        return f"❌ Error analyzing {clip_path}: {str(e)}"
+    
+    finally:
+        # Clean up
+        genai.delete_file(video_file.name)
 
 def main():
     print("🔄 GAA TURNOVER ANALYSIS - STEP 1: VIDEO → TEXT")
@@ -125,7 +148,9 @@ def main():
     
     # Configuration
     TIME_LIMIT_MINUTES = 10  # Analyze first 10 minutes
-    MAX_WORKERS = 8
+    INITIAL_CONCURRENCY = 8   # Generate calls in flight at the start
+    MAX_CONCURRENCY = 32      # Ceiling the adaptive limit can grow to (and thread count)
+    MIN_CONCURRENCY = 4       # Floor a rate limit can halve it down to
     
     # Setup paths
     clips_base = Path("../3.5-video-splitting/clips/first_half")
@@ -141,37 +166,32 @@ def main():
     target_clips = []
     
     for clip in all_clips:
-        if "clip_" in clip.name:
-            parts = clip.stem.replace("clip_", "").split("m")
-            if len(parts) >= 1:
-                try:
-                    minutes = int(parts[0])
-                    if minutes < TIME_LIMIT_MINUTES:
-                        target_clips.append(clip)
-                except ValueError:
-                    continue
+        # One match gives both the minute filter and the display timestamp
+        match = CLIP_NAME_PATTERN.match(clip.stem)
+        if match and int(match.group(1)) < TIME_LIMIT_MINUTES:
+            target_clips.append((clip, f"{match.group(1)}:{match.group(2)}"))
     
     print(f"📊 Found {len(target_clips)} clips in first {TIME_LIMIT_MINUTES} minutes")
-    print(f"🧵 Using {MAX_WORKERS} threads for processing")
+    print(f"🧵 Using {MAX_CONCURRENCY} threads, {INITIAL_CONCURRENCY} concurrent requests to start (adapts to rate limits)")
     
     # Process clips in parallel
     start_time = time.time()
-    completed = 0
+    last_report = start_time
+    finished = 0  # Clips done either way, so the last report always prints
+    failed = 0
+    generate_slots = AdaptiveLimit(INITIAL_CONCURRENCY, MAX_CONCURRENCY, MIN_CONCURRENCY)
     
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENCY) as executor:
         futures = []
         
-        for video_file in target_clips:
+        for video_file, timestamp in target_clips:
             # Skip if already processed
             output_file = output_dir / f"{video_file.stem}.txt"
             if output_file.exists():
                 print(f"⏭️  Skipping {video_file.name} (already processed)")
                 continue
             
-            # Extract timestamp from filename
-            timestamp = video_file.stem.replace('clip_', '').replace('m', ':').replace('s', '')
-            
-            future = executor.submit(analyze_clip_for_turnovers, str(video_file), timestamp, "first_half")
+            future = executor.submit(analyze_clip_for_turnovers, str(video_file), timestamp, "first_half", generate_slots)
             futures.append((future, video_file, timestamp))
         
         # Collect results with progress
@@ -187,16 +207,22 @@ def main():
                     f.write(f"CLIP_FILE: {video_file.name}\n")
                     f.write(f"ANALYSIS:\n{result}\n")
                 
-                completed += 1
-                progress = (completed / len(futures)) * 100 if futures else 0
-                elapsed = time.time() - start_time
-                rate = completed / elapsed if elapsed > 0 else 0
-                
-                print(f"📈 Progress: {completed}/{len(futures)} ({progress:.1f}%) | "
-                      f"Rate: {rate:.1f} clips/s")
-                
             except Exception as e:
+                # Not written, so the clip is picked up again on the next run
                 print(f"❌ Error processing {video_file}: {e}")
+                failed += 1
+            
+            finished += 1
+            now = time.time()
+            if now - last_report < PROGRESS_SECONDS and finished < len(futures):
+                continue
+            last_report = now
+            progress = (finished / len(futures)) * 100
+            elapsed = now - start_time
+            rate = finished / elapsed if elapsed > 0 else 0
+            
+            print(f"📈 Progress: {finished}/{len(futures)} ({progress:.1f}%, {failed} failed) | "
+                  f"Rate: {rate:.1f} clips/s | Concurrency: {generate_slots.limit}")
     
     processing_time = time.time() - start_time
     
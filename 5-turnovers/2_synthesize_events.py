@@ -7,90 +7,147 @@ Text descriptions → Timeline JSON for webapp (GAA Events Schema)
 import json
 import os
 import re
+import sys
+import argparse
 from pathlib import Path
-import google.generativeai as genai
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
-# Load environment variables
+# Helpers shared by all stages live in gaa_common/ at the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from gaa_common.llm_cache import LLMCache, make_key
+from gaa_common.synthesis import (
+    get_synthesis_model, submit_batch, loads_json, write_json, extract_events_json, stream_response_text,
+)
+
+# Load environment variables (Gemini itself is configured on first use, so --help
+# and cached runs need no API key)
 load_dotenv()
 
-# Configure Gemini
-GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY environment variable not set")
-genai.configure(api_key=GEMINI_API_KEY)
+# Analysis files are named after their clip: clip_<minutes>m<seconds>s.txt
+CLIP_NAME_PATTERN = re.compile(r'clip_(\d+)m(\d+)s\.txt$')
+
+SYNTHESIS_MODEL_NAME = "gemini-2.5-pro"
+
+# Header lines written by 1_analyze_clips.py
+TIMESTAMP_PATTERN = re.compile(r'TIMESTAMP: (\d+:\d+)')
+CLIP_FILE_PATTERN = re.compile(r'CLIP_FILE: (clip_\d+m\d+s\.mp4)')
+
+# Only clips whose analysis reports a turnover carry event data; model output varies
+# ("TURNOVER: Yes", "**TURNOVER:** YES", "TURNOVER: [YES]"), so match loosely
+TURNOVER_MARKER = re.compile(rb'TURNOVER\W*YES', re.IGNORECASE)
+
+# Parallel analysis reads (helps most on network/slow disks)
+READ_WORKERS = 16
+
+# File name -> mtime + parsed result, so re-runs only re-read changed analysis files
+# Bump PARSED_CACHE_FORMAT whenever read_analysis changes what it keeps, so old entries are re-read
+PARSED_CACHE = Path(".cache/turnover_analyses.json")
+PARSED_CACHE_FORMAT = 2
+
+def read_analysis(file_path):
+    """Read one turnover analysis file -> result dict, or None if unreadable / no turnover / missing its header"""
+    # Only the file read is guarded; parsing below can't raise on a readable file
+    try:
+        # Whole-file read without the buffered text wrapper
+        data = Path(file_path).read_bytes()
+    except OSError as e:
+        print(f"⚠️  Error reading {file_path}: {e}")
+        return None
+    
+    # Checked on the raw bytes, so files without a turnover are never decoded
+    if not TURNOVER_MARKER.search(data):
+        return None
+    content = data.decode('utf-8', errors='replace')
+    
+    # Extract metadata from content
+    timestamp_match = TIMESTAMP_PATTERN.search(content)
+    clip_file_match = CLIP_FILE_PATTERN.search(content)
+    if not (timestamp_match and clip_file_match):
+        return None
+    
+    timestamp = timestamp_match.group(1)
+    minutes, seconds = map(int, timestamp.split(':'))
+    clip_start_time = minutes * 60 + seconds
+    
+    return {
+        'file': os.path.basename(file_path),
+        'half': 'first_half',
+        'clip_start_time': clip_start_time,
+        'timestamp': timestamp,
+        'clip_file': clip_file_match.group(1),
+        'content': content
+    }
 
 def collect_analysis_results(analysis_dir):
-    """Collect all analysis results from the directory"""
-    results = []
+    """Collect the analysis results that report a turnover from the directory
     
+    Returns None if nothing has been analysed yet; an empty list just means no turnovers.
+    """
     analysis_dir = Path(analysis_dir)
     if not analysis_dir.exists():
         print(f"❌ Analysis directory not found: {analysis_dir}")
-        return results
+        return None
     
-    analysis_files = sorted(analysis_dir.glob("*.txt"))
-    print(f"📋 Found {len(analysis_files)} analysis files")
+    # scandir yields names without a stat/Path object per entry; the clip time in
+    # each name orders the files, so results come back already sorted by time
+    timed_files = []
+    with os.scandir(analysis_dir) as entries:
+        for entry in entries:
+            match = CLIP_NAME_PATTERN.match(entry.name)
+            if match:
+                start = int(match.group(1)) * 60 + int(match.group(2))
+                timed_files.append((start, entry.name, entry.path, entry.stat().st_mtime))
+    timed_files.sort()
+    print(f"📋 Found {len(timed_files)} analysis files")
+    if not timed_files:
+        return None
     
-    for file_path in analysis_files:
-        try:
-            with open(file_path, 'r') as f:
-                content = f.read()
-            
-            # Extract metadata from content
-            timestamp_match = re.search(r'TIMESTAMP: (\d+:\d+)', content)
-            clip_file_match = re.search(r'CLIP_FILE: (clip_\d+m\d+s\.mp4)', content)
-            
-            if timestamp_match and clip_file_match:
-                timestamp = timestamp_match.group(1)
-                minutes, seconds = map(int, timestamp.split(':'))
-                clip_start_time = minutes * 60 + seconds
-                
-                results.append({
-                    'file': file_path.name,
-                    'half': 'first_half',
-                    'clip_start_time': clip_start_time,
-                    'timestamp': timestamp,
-                    'clip_file': clip_file_match.group(1),
-                    'content': content
-                })
-                
-        except Exception as e:
-            print(f"⚠️  Error reading {file_path}: {e}")
-    
-    # Sort by time
-    results.sort(key=lambda x: x['clip_start_time'])
-    
-    return results
-
-def synthesize_events_with_ai(analysis_results):
-    """Use Gemini 2.5 Pro to synthesize all analysis results into GAA Events Schema format"""
+    try:
+        cached = loads_json(PARSED_CACHE.read_bytes()) if PARSED_CACHE.exists() else {}
+    except json.JSONDecodeError:
+        cached = {}
+    parsed = cached.get('files', {}) if cached.get('format') == PARSED_CACHE_FORMAT else {}
     
-    # Prepare comprehensive prompt
-    all_analyses = ""
-    for result in analysis_results:
-        all_analyses += f"\n--- {result['timestamp']} (starts at {result['clip_start_time']}s) ---\n"
-        all_analyses += result['content']
-        all_analyses += "\n"
+    # Only new or modified files are read again
+    changed = [(name, path, mtime) for _, name, path, mtime in timed_files
+               if parsed.get(name, {}).get('mtime') != mtime]
+    print(f"💾 Reusing {len(timed_files) - len(changed)} unchanged analyses, reading {len(changed)}")
+    
+    # File reads are I/O-bound, so overlap them across threads (map keeps input order)
+    with ThreadPoolExecutor(max_workers=READ_WORKERS) as executor:
+        for (name, _, mtime), result in zip(changed, executor.map(read_analysis, [path for _, path, _ in changed])):
+            parsed[name] = {'mtime': mtime, 'result': result}
+    
+    # Files that have been removed are dropped from the cache
+    parsed = {name: parsed[name] for _, name, _, _ in timed_files}
+    PARSED_CACHE.parent.mkdir(parents=True, exist_ok=True)
+    write_json({'format': PARSED_CACHE_FORMAT, 'files': parsed}, PARSED_CACHE)
     
-    prompt = f"""
-You are an expert GAA analyst synthesizing turnover data from {len(analysis_results)} clip analyses.
+    return [parsed[name]['result'] for _, name, _, _ in timed_files if parsed[name]['result']]
+
+# Static parts of the turnover synthesis prompt, built once; only the analyses
+# and clip count change per request
+SYNTHESIS_PROMPT_HEADER = """
+You are an expert GAA analyst synthesizing turnover data from {clip_count} clip analyses.
 
 TASK: Create GAA Events Schema compliant JSON for webapp consumption.
 
 ANALYSIS DATA:
-{all_analyses}
+"""
+
+SYNTHESIS_PROMPT_TAIL = """
 
 REQUIRED OUTPUT FORMAT (GAA Events Schema):
-{{
-  "match_info": {{
+{
+  "match_info": {
     "title": "GAA Match - Turnover Events",
     "description": "AI-detected turnover events with exact timing",
     "total_events": [number],
     "analysis_method": "AI video analysis"
-  }},
+  },
   "events": [
-    {{
+    {
       "id": "turnover_1",
       "time": [absolute seconds from match start],
       "team": "red" or "blue",
@@ -98,9 +155,9 @@ REQUIRED OUTPUT FORMAT (GAA Events Schema):
       "outcome": "Won" or "Lost",
       "autoGenerated": true,
       "validated": false
-    }}
+    }
   ]
-}}
+}
 
 SYNTHESIS REQUIREMENTS:
 1. Only include confirmed turnovers (TURNOVER: YES with confidence ≥7)
@@ -133,30 +190,72 @@ IMPORTANT:
 
 Generate the complete JSON:
 """
+
+def synthesize_events_with_ai(analysis_results, use_batch=False):
+    """Use Gemini 2.5 Pro to synthesize all analysis results into GAA Events Schema format"""
+    
+    # Prepare comprehensive prompt (fragments joined once, not re-copied per clip)
+    parts = []
+    for result in analysis_results:
+        parts.append(f"\n--- {result['timestamp']} (starts at {result['clip_start_time']}s) ---\n")
+        parts.append(result['content'])
+        parts.append("\n")
+    all_analyses = "".join(parts)
+    
+    prompt = "".join([
+        SYNTHESIS_PROMPT_HEADER.format(clip_count=len(analysis_results)),
+        all_analyses,
+        SYNTHESIS_PROMPT_TAIL,
+    ])
     
     try:
         print(f"🤖 Sending {len(analysis_results)} analyses to Gemini 2.5 Pro...")
         print(f"📝 Prompt size: {len(prompt):,} characters")
         
-        model = genai.GenerativeModel("gemini-2.5-pro")
-        response = model.generate_content(prompt)
+        # Unchanged analyses give an identical prompt, answered from the local cache
+        cache = LLMCache()
+        cache_key = make_key(SYNTHESIS_MODEL_NAME, prompt)
+        response_text = cache.get(cache_key)
+        
+        if response_text is not None:
+            print("💾 Using cached synthesis (analyses unchanged)")
+        elif use_batch:
+            response_text = submit_batch([prompt], SYNTHESIS_MODEL_NAME, "turnover-synthesis")[0]
+            if response_text is None:
+                print("❌ Batch job returned no response for the synthesis prompt")
+                return None
+        else:
+            model = get_synthesis_model(SYNTHESIS_MODEL_NAME)
+            response_text = stream_response_text(model, prompt)
         
-        print(f"✅ AI synthesis complete! Response size: {len(response.text):,} characters")
+        print(f"✅ AI synthesis complete! Response size: {len(response_text):,} characters")
         
-        # Extract JSON from response
-        json_match = re.search(r'\{.*\}', response.text, re.DOTALL)
-        if json_match:
-            json_text = json_match.group(0)
-            return json.loads(json_text)
+        # Extract JSON from response; only parsed events are cached, so a bad reply is retried next run
+        event_data = extract_events_json(response_text)
+        if event_data is not None:
+            cache.set(cache_key, json.dumps(event_data))
+            return event_data
         else:
             print("❌ Could not extract JSON from AI response")
-            print("Raw response:", response.text[:500] + "...")
+            print("Raw response:", response_text[:500] + "...")
             return None
             
     except Exception as e:
         print(f"❌ AI synthesis failed: {e}")
         return None
 
+def empty_events():
+    """GAA Events Schema JSON for a period with no turnovers"""
+    return {
+        "match_info": {
+            "title": "GAA Match - Turnover Events",
+            "description": "AI-detected turnover events with exact timing",
+            "total_events": 0,
+            "analysis_method": "AI video analysis"
+        },
+        "events": []
+    }
+
 def validate_gaa_schema(event_data):
     """Validate the output against GAA Events Schema"""
     
@@ -213,8 +312,7 @@ def save_webapp_json(event_data, output_dir):
     
     # Save main webapp JSON
     webapp_json = output_dir / "turnover_events.json"
-    with open(webapp_json, 'w') as f:
-        json.dump(event_data, f, indent=2)
+    write_json(event_data, webapp_json)
     print(f"💾 Webapp JSON saved: {webapp_json}")
     
     # Save summary text
@@ -239,15 +337,22 @@ def save_webapp_json(event_data, output_dir):
         
         # List events
         f.write("Event Timeline:\n")
-        for event in event_data.get('events', []):
-            time_str = f"{event['time']//60:02.0f}:{event['time']%60:02.0f}"
-            f.write(f"  {time_str} - {event['team']} {event['action']} ({event['outcome']})\n")
+        f.writelines(
+            f"  {event['time']//60:02.0f}:{event['time']%60:02.0f} - "
+            f"{event['team']} {event['action']} ({event['outcome']})\n"
+            for event in event_data.get('events', [])
+        )
     
     print(f"📄 Summary saved: {summary_file}")
     
     return webapp_json
 
 def main():
+    parser = argparse.ArgumentParser(description='Synthesize turnover analyses into GAA Events Schema JSON')
+    parser.add_argument('--batch', action='store_true',
+                       help='Send the synthesis prompt through Gemini Batch Mode (~50%% cheaper, can take minutes)')
+    args = parser.parse_args()
+    
     print("🔄 GAA TURNOVER SYNTHESIS - STEP 2: TEXT → GAA EVENTS SCHEMA")
     print("=" * 60)
     
@@ -259,18 +364,23 @@ def main():
     print("📋 Collecting analysis results...")
     analysis_results = collect_analysis_results(analysis_dir)
     
-    if not analysis_results:
+    if analysis_results is None:
         print("❌ No analysis results found!")
         print(f"   Make sure to run '1_analyze_clips.py' first")
         return
     
-    print(f"✅ Found {len(analysis_results)} analysis files")
+    print(f"✅ Found {len(analysis_results)} turnover analyses")
     
-    # Synthesize with AI
-    print("🤖 Synthesizing events with Gemini 2.5 Pro...")
-    event_data = synthesize_events_with_ai(analysis_results)
+    if not analysis_results:
+        # No turnovers is a valid result: write an empty timeline rather than keep a stale one
+        print("ℹ️  No turnovers detected, writing an empty timeline")
+        event_data = empty_events()
+    else:
+        # Synthesize with AI
+        print("🤖 Synthesizing events with Gemini 2.5 Pro...")
+        event_data = synthesize_events_with_ai(analysis_results, use_batch=args.batch)
     
-    if not event_data:
+    if event_data is None:
         print("❌ Synthesis failed!")
         return
     
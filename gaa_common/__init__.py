@@ -0,0 +1,4 @@
+"""
+gaa_common - Helpers shared by the pipeline stages
+Stage scripts put the repo root on sys.path and import from here
+"""
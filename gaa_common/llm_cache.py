@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+llm_cache.py - Persistent Gemini Response Cache
+SQLite store of response text keyed by SHA-256 of (model, prompt, clip bytes)
+"""
+
+import hashlib
+import sqlite3
+import time
+from pathlib import Path
+from threading import Lock
+
+# Optional: compress stored responses (plain text compresses ~5x)
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_CACHE_PATH = Path(".cache/llm_cache.sqlite3")
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def make_key(model_name, prompt, file_path=None):
+    """Hash model + prompt (and the clip's bytes, streamed, if a video is sent)"""
+    digest = hashlib.sha256(f"{model_name}|{prompt}".encode('utf-8'))
+
+    if file_path is not None:
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+
+    return digest.hexdigest()
+
+def _encode(text):
+    data = text.encode('utf-8')
+    if zstandard is not None:
+        return zstandard.ZstdCompressor().compress(data)
+    return data
+
+def _decode(blob):
+    blob = bytes(blob)
+    if blob.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            # Written by a run that had zstandard installed - treat as a miss
+            return None
+        blob = zstandard.ZstdDecompressor().decompress(blob)
+    return blob.decode('utf-8')
+
+class LLMCache:
+    """Exact-match response cache shared by all worker threads of a run"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, response BLOB, created REAL)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        """Return the cached response text, or None on a miss"""
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM cache WHERE key = ?", (key,)).fetchone()
+        return _decode(row[0]) if row else None
+
+    def set(self, key, response_text):
+        """Store response text under key"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, response, created) VALUES (?, ?, ?)",
+                (key, _encode(response_text), time.time())
+            )
+            self._conn.commit()
+
+    def get_or_set(self, key, fetch_fn):
+        """Return the cached response, calling fetch_fn() and storing it on a miss"""
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        response_text = fetch_fn()
+        self.set(key, response_text)
+        return response_text
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+synthesis.py - Shared Helpers for the Event Synthesis Steps
+Lazy Gemini setup, Batch Mode, streaming and JSON extraction for text → events JSON
+"""
+
+import json
+import os
+import time
+import google.generativeai as genai
+from google import genai as google_genai
+
+# Optional: faster JSON parsing/writing (falls back to the standard library)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Gemini Batch Mode settings (--batch)
+BATCH_POLL_SECONDS = 30
+BATCH_DONE_STATES = {"JOB_STATE_SUCCEEDED", "JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+
+# Models built so far, by name; Gemini is configured on first use, so --help and
+# cached runs need no API key
+_models = {}
+
+def require_api_key():
+    """The Gemini API key, or a clear error if it isn't set"""
+    api_key = os.getenv('GEMINI_API_KEY')
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY environment variable not set")
+    return api_key
+
+def get_synthesis_model(model_name):
+    """Configure Gemini and build the named synthesis model once, on first use"""
+    if model_name not in _models:
+        genai.configure(api_key=require_api_key())
+        _models[model_name] = genai.GenerativeModel(model_name)
+    return _models[model_name]
+
+def submit_batch(prompts, model_name, display_name):
+    """Run text prompts as one Gemini Batch Mode job (~50% cheaper) -> response text per prompt (None on error)"""
+    client = google_genai.Client(api_key=require_api_key())
+    job = client.batches.create(
+        model=model_name,
+        src=[{"contents": [{"role": "user", "parts": [{"text": prompt}]}]} for prompt in prompts],
+        config={"display_name": display_name},
+    )
+    print(f"📤 Submitted {job.name} ({len(prompts)} prompts), polling every {BATCH_POLL_SECONDS}s...")
+    
+    while job.state.name not in BATCH_DONE_STATES:
+        time.sleep(BATCH_POLL_SECONDS)
+        job = client.batches.get(name=job.name)
+    
+    if job.state.name != "JOB_STATE_SUCCEEDED":
+        raise RuntimeError(f"{job.name} finished with state {job.state.name}")
+    
+    # Inline responses come back in submission order
+    return [
+        inline.response.text if inline.response and not inline.error else None
+        for inline in job.dest.inlined_responses
+    ]
+
+def loads_json(text):
+    """Parse JSON text with orjson when available"""
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+def write_json(data, path):
+    """Write data as indented JSON, serialized straight to bytes by orjson when available"""
+    if orjson is not None:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+def iter_json_blocks(text):
+    """Yield each top-level balanced {...} block in a model response, in order"""
+    start = text.find('{')
+    while start != -1:
+        # Single pass tracking brace depth, ignoring braces inside JSON strings
+        depth = 0
+        in_string = False
+        escaped = False
+        for i in range(start, len(text)):
+            char = text[i]
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == '\\':
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char == '{':
+                depth += 1
+            elif char == '}':
+                depth -= 1
+                if depth == 0:
+                    yield text[start:i + 1]
+                    start = text.find('{', i + 1)
+                    break
+        else:
+            return  # Unbalanced (e.g. still streaming)
+
+def extract_events_json(text):
+    """First object in a model response that parses and has an "events" list (skipping any preamble), or None"""
+    for block in iter_json_blocks(text):
+        try:
+            data = loads_json(block)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(data, dict) and isinstance(data.get('events'), list):
+            return data
+    return None
+
+def stream_response_text(model, prompt):
+    """Stream a response, stopping once the events document has closed and parses"""
+    parts = []
+    for chunk in model.generate_content(prompt, stream=True):
+        parts.append(chunk.text)
+        # Only a chunk containing '}' can complete the document
+        if '}' in chunk.text and extract_events_json("".join(parts)) is not None:
+            break
+    return "".join(parts)
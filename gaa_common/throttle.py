@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+throttle.py - Retry and Adaptive Concurrency for Gemini Calls
+Threaded and asyncio versions, so every stage backs off the same way
+"""
+
+import time
+import random
+import asyncio
+import threading
+from google.api_core import exceptions as google_exceptions
+
+# Retry settings for transient Gemini errors (429 rate limit, 500/503)
+MAX_RETRIES = 6
+MAX_BACKOFF_SECONDS = 60
+TRANSIENT_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+)
+
+def backoff_delay(attempt):
+    """Jittered exponential backoff for a retry attempt, capped at MAX_BACKOFF_SECONDS"""
+    return min(2 ** attempt, MAX_BACKOFF_SECONDS) * random.uniform(0.5, 1.5)
+
+def with_retry(call, *args, **kwargs):
+    """Call call(*args, **kwargs), retrying transient errors with jittered exponential backoff"""
+    for attempt in range(MAX_RETRIES):
+        try:
+            return call(*args, **kwargs)
+        except TRANSIENT_ERRORS as e:
+            if attempt == MAX_RETRIES - 1:
+                raise
+            delay = backoff_delay(attempt)
+            print(f"⏳ {type(e).__name__}, retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
+async def async_with_retry(call, *args, **kwargs):
+    """Await call(*args, **kwargs), retrying transient errors with jittered exponential backoff"""
+    for attempt in range(MAX_RETRIES):
+        try:
+            return await call(*args, **kwargs)
+        except TRANSIENT_ERRORS as e:
+            if attempt == MAX_RETRIES - 1:
+                raise
+            delay = backoff_delay(attempt)
+            print(f"⏳ {type(e).__name__}, retrying in {delay:.1f}s...")
+            await asyncio.sleep(delay)
+
+class AdaptiveLimit:
+    """Concurrency limit that grows by one per success and halves on a rate limit (AIMD), for threads"""
+    
+    def __init__(self, initial, maximum, minimum=1):
+        self.limit = initial
+        self.maximum = maximum
+        self.minimum = minimum
+        self.in_flight = 0
+        # Bumped on every cut; 429s from calls admitted before it are the same congestion event
+        self._epoch = 0
+        self._changed = threading.Condition()
+    
+    def run(self, call, *args, **kwargs):
+        """Call call(*args, **kwargs) once a slot is free, adjusting the limit by the outcome"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+            admitted_epoch = self._epoch
+        try:
+            result = call(*args, **kwargs)
+        except google_exceptions.ResourceExhausted:
+            with self._changed:
+                if admitted_epoch == self._epoch:
+                    self.limit = max(self.minimum, self.limit // 2)
+                    self._epoch += 1
+            raise
+        else:
+            with self._changed:
+                self.limit = min(self.maximum, self.limit + 1)
+            return result
+        finally:
+            with self._changed:
+                self.in_flight -= 1
+                self._changed.notify_all()
+
+class AsyncAdaptiveLimit:
+    """AdaptiveLimit for coroutines sharing one event loop"""
+    
+    def __init__(self, initial, maximum, minimum=1):
+        self.limit = initial
+        self.maximum = maximum
+        self.minimum = minimum
+        self.in_flight = 0
+        # Bumped on every cut; 429s from calls admitted before it are the same congestion event
+        self._epoch = 0
+        self._changed = asyncio.Condition()
+    
+    async def run(self, call, *args, **kwargs):
+        """Await call(*args, **kwargs) once a slot is free, adjusting the limit by the outcome"""
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+            admitted_epoch = self._epoch
+        try:
+            result = await call(*args, **kwargs)
+        except google_exceptions.ResourceExhausted:
+            # Single event loop: no other coroutine runs between the check and the cut
+            if admitted_epoch == self._epoch:
+                self.limit = max(self.minimum, self.limit // 2)
+                self._epoch += 1
+            raise
+        else:
+            self.limit = min(self.maximum, self.limit + 1)
+            return result
+        finally:
+            async with self._changed:
+                self.in_flight -= 1
+                self._changed.notify_all()